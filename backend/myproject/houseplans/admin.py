@@ -3,6 +3,7 @@ from django.urls import path
 from django.shortcuts import redirect
 from django.http import HttpResponseRedirect
 from .models import HousePlan, HousePlanImage, Floor, Feature, Amenity, Room, QuoteRequest, ContactMessage, SiteSettings, Purchase
+from .search import search_plan_ids
 
 
 class RoomInline(admin.TabularInline):
@@ -14,7 +15,8 @@ class RoomInline(admin.TabularInline):
 class HousePlanImageInline(admin.TabularInline):
     model = HousePlanImage
     extra = 1
-    fields = ('image', 'title', 'order')
+    fields = ('image', 'upload_status', 'title', 'order')
+    readonly_fields = ('upload_status',)
 
 
 class FloorInline(admin.TabularInline):
@@ -40,7 +42,10 @@ class HousePlanAdmin(admin.ModelAdmin):
     list_display = ('title', 'bedrooms', 'bathrooms', 'price', 'is_popular', 'is_best_selling', 'is_new', 'created_at')
     list_filter = ('is_popular', 'is_best_selling', 'is_new', 'is_pet_friendly', 'bedrooms', 'bathrooms', 'created_at')
     search_fields = ('title', 'description')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'total_floor_area', 'floor_count', 'room_count', 'room_type_counts', 'primary_image_upload_status',
+        'created_at', 'updated_at',
+    )
     inlines = [HousePlanImageInline, FloorInline, FeatureInline, AmenityInline]
     
     fieldsets = (
@@ -57,8 +62,12 @@ class HousePlanAdmin(admin.ModelAdmin):
         ('Specifications', {
             'fields': ('bedrooms', 'bathrooms', 'garage', 'square_feet', 'width_meters', 'depth_meters')
         }),
+        ('Computed Totals', {
+            'fields': ('total_floor_area', 'floor_count', 'room_count', 'room_type_counts'),
+            'description': 'Summed from the floors and rooms below when the plan is saved'
+        }),
         ('Media & Links', {
-            'fields': ('primary_image', 'video_url'),
+            'fields': ('primary_image', 'primary_image_upload_status', 'video_url'),
             'description': 'Primary/thumbnail image and YouTube video URL'
         }),
         ('Features & Status', {
@@ -69,6 +78,12 @@ class HousePlanAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans over title/description
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=search_plan_ids(search_term)), False
 
 
 @admin.register(HousePlanImage)
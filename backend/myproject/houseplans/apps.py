@@ -4,3 +4,6 @@ class HouseplansConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'houseplans'
     verbose_name = 'House Plans Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
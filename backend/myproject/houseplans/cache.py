@@ -0,0 +1,166 @@
+"""
+Versioned response cache for the read-only API.
+
+Cached responses are keyed by namespace, namespace version, path and the
+normalized query string. Catalog and site settings signals bump the namespace
+version, which orphans every cached response of that namespace in O(1)
+instead of scanning for keys; orphaned entries simply expire.
+
+The version counters and hit/miss statistics live in the cache itself, so
+they are shared by all gunicorn workers whenever the configured backend is
+(file or database cache), and per-process with the local-memory backend,
+which settings only allow with a single worker. Statistics are counted in
+process memory and added to the cache at most every
+API_CACHE_STATS_FLUSH_INTERVAL seconds, so requests don't pay for cache
+writes that only the stats endpoint reads.
+"""
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+CATALOG = 'catalog'
+SITE_SETTINGS = 'site_settings'
+NAMESPACES = (CATALOG, SITE_SETTINGS)
+COMPRESSION_STATS = ('responses', 'variant_hits', 'bytes_in', 'bytes_out')
+
+KEY_PREFIX = 'houseplans'
+
+# Statistics recorded by this process and not yet added to the cache
+_stats = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed_at = time.monotonic()
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _incr(key, delta=1):
+    cache = get_cache()
+    # add() is a no-op when the key exists, so concurrent first hits can't reset a counter
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def get_version(namespace):
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        # Seed a lost (evicted or cleared) counter from the clock, so it never
+        # goes back to a version that something may still hold on to
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version if version is not None else 0
+
+
+def versions_shared():
+    """Whether every process reads the same namespace versions"""
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def bump_version(namespace):
+    """Invalidate every cached response of a namespace"""
+    get_version(namespace)
+    return _incr(f'{KEY_PREFIX}:version:{namespace}')
+
+
+def record(namespace, outcome, delta=1):
+    global _stats_flushed_at
+    with _stats_lock:
+        _stats[f'{KEY_PREFIX}:stats:{namespace}:{outcome}'] += delta
+        if time.monotonic() - _stats_flushed_at < settings.API_CACHE_STATS_FLUSH_INTERVAL:
+            return
+    flush_stats()
+
+
+def flush_stats():
+    """Add the counts this process recorded since the last flush to the shared counters"""
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = dict(_stats)
+        _stats.clear()
+        _stats_flushed_at = time.monotonic()
+    for key, delta in pending.items():
+        _incr(key, delta)
+
+
+def cache_stats():
+    """Hit/miss counters and current version of each namespace"""
+    flush_stats()
+    cache = get_cache()
+    stats = {}
+    for namespace in NAMESPACES:
+        keys = {
+            'hits': f'{KEY_PREFIX}:stats:{namespace}:hits',
+            'misses': f'{KEY_PREFIX}:stats:{namespace}:misses',
+            'version': f'{KEY_PREFIX}:version:{namespace}',
+        }
+        values = cache.get_many(keys.values())
+        stats[namespace] = {name: values.get(key, 0) for name, key in keys.items()}
+
+    keys = {name: f'{KEY_PREFIX}:stats:compression:{name}' for name in COMPRESSION_STATS}
+    values = cache.get_many(keys.values())
+    stats['compression'] = {name: values.get(key, 0) for name, key in keys.items()}
+    stats['compression']['bytes_saved'] = stats['compression']['bytes_in'] - stats['compression']['bytes_out']
+    return stats
+
+
+def response_cache_key(namespace, request):
+    # Parameter order doesn't change the response, so sort it out of the key
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'{KEY_PREFIX}:response:{namespace}:{get_version(namespace)}:{digest}'
+
+
+def cache_response(namespace):
+    """Cache successful JSON GET responses of a view until its namespace version changes"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = response_cache_key(namespace, request)
+            cached = cache.get(key)
+            if cached is not None:
+                record(namespace, 'hits')
+                response = HttpResponse(cached['content'], content_type=cached['content_type'])
+                # Lets the compression middleware reuse the compressed body stored next to it
+                response.compression_key = key
+                return response
+
+            record(namespace, 'misses')
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # DRF responses only know their final content type once rendered
+            if hasattr(response, 'render'):
+                response.render()
+            content_type = response.get('Content-Type', '')
+            if content_type.startswith('application/json'):
+                cache.set(
+                    key,
+                    {'content': response.content, 'content_type': content_type},
+                    settings.API_CACHE_TIMEOUT,
+                )
+                if not hasattr(response, 'compression_key'):
+                    response.compression_key = key
+            return response
+        return wrapped
+    return decorator
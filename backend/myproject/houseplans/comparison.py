@@ -0,0 +1,94 @@
+"""
+Side-by-side comparison of house plans.
+
+Every figure comes from a grouped aggregate query over all compared plans
+at once, so the cost doesn't depend on how many floors or rooms they have.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, Sum
+
+from .fastpath import field_converters
+from .models import HousePlan, Floor, Room
+from .serializers import HousePlanDetailSerializer, FloorSerializer
+
+MIN_PLANS = 2
+MAX_PLANS = 6
+
+SPEC_FIELDS = [
+    'price', 'bedrooms', 'bathrooms', 'garage', 'square_feet', 'width_meters', 'depth_meters',
+    'land_size', 'property_type', 'style', 'status',
+]
+FLOOR_FIELDS = ['level', 'floor_area', 'bedrooms', 'bathrooms', 'lounges', 'dining_areas']
+FLOOR_TOTALS = ['floor_area', 'bedrooms', 'bathrooms', 'lounges', 'dining_areas']
+
+
+def _represent(converters, row):
+    """Format decimals the same way the serializers do"""
+    return {
+        name: converters[name](value) if name in converters and value is not None else value
+        for name, value in row.items()
+    }
+
+
+def compare_plans(plan_ids):
+    """
+    Build the comparison matrix of the given plans, in the given order.
+    Returns None when any of the plans doesn't exist.
+    """
+    plan_converters = field_converters(HousePlanDetailSerializer)
+    floor_converters = field_converters(FloorSerializer)
+
+    plans = {
+        row['id']: row
+        for row in HousePlan.objects.filter(pk__in=plan_ids).values('id', 'title', *SPEC_FIELDS)
+    }
+    if len(plans) != len(plan_ids):
+        return None
+
+    floors = Floor.objects.filter(house_plan__in=plan_ids)
+    totals = {
+        row.pop('house_plan_id'): row
+        for row in floors.order_by().values('house_plan_id').annotate(
+            floor_count=Count('id'), **{name: Sum(name) for name in FLOOR_TOTALS}
+        )
+    }
+
+    per_floor = defaultdict(list)
+    floor_rows = (
+        floors.order_by('order')
+        .values('house_plan_id', 'id', *FLOOR_FIELDS)
+        .annotate(room_count=Sum('rooms__quantity'))
+    )
+    for row in floor_rows:
+        row['room_count'] = row['room_count'] or 0
+        per_floor[row.pop('house_plan_id')].append(_represent(floor_converters, row))
+
+    room_types = defaultdict(lambda: [0] * len(plan_ids))
+    position = {pk: index for index, pk in enumerate(plan_ids)}
+    room_rows = (
+        Room.objects.filter(floor__house_plan__in=plan_ids)
+        .values('floor__house_plan_id', 'name')
+        .annotate(total=Sum('quantity'))
+        .order_by('name')
+    )
+    for row in room_rows:
+        room_types[row['name']][position[row['floor__house_plan_id']]] = row['total']
+
+    empty_totals = {'floor_count': 0, **{name: None for name in FLOOR_TOTALS}}
+    return {
+        'plans': [{'id': pk, 'title': plans[pk]['title']} for pk in plan_ids],
+        'specs': {
+            name: [_represent(plan_converters, {name: plans[pk][name]})[name] for pk in plan_ids]
+            for name in SPEC_FIELDS
+        },
+        'totals': {
+            name: [
+                _represent(floor_converters, {name: totals.get(pk, empty_totals)[name]})[name]
+                for pk in plan_ids
+            ]
+            for name in ['floor_count', *FLOOR_TOTALS]
+        },
+        'floors': [per_floor[pk] for pk in plan_ids],
+        'room_types': dict(room_types),
+    }
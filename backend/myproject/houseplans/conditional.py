@@ -0,0 +1,85 @@
+"""
+Conditional GET support for the read-only catalog endpoints.
+
+Validators come from `updated_at` columns: catalog signals touch a plan's
+`updated_at` whenever one of its images, floors, rooms, features or amenities
+changes, so the plan timestamp doubles as the change marker of its child rows.
+A request carrying a matching If-None-Match / If-Modified-Since gets a 304
+before the view (and its serializers) run. Catalog-wide listings only have an
+ETag, since deletes don't move any timestamp.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from .cache import CATALOG, SITE_SETTINGS, get_version
+from .models import HousePlan, SiteSettings
+
+
+def make_etag(request, *parts):
+    """Hash the validator parts together with the full path, so every query string has its own ETag"""
+    key = ':'.join(str(part) for part in (request.get_full_path(), *parts))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def conditional_on(validators_func):
+    """
+    Like django.views.decorators.http.condition, but the ETag and
+    Last-Modified are computed from a single `validators_func` call,
+    which returns (etag, last_modified) or None.
+    """
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_validators'):
+            request._conditional_validators = validators_func(request, *args, **kwargs)
+        return request._conditional_validators
+
+    def etag_func(request, *args, **kwargs):
+        validators = get_validators(request, *args, **kwargs)
+        return validators[0] if validators else None
+
+    def last_modified_func(request, *args, **kwargs):
+        validators = get_validators(request, *args, **kwargs)
+        return validators[1] if validators else None
+
+    return condition(etag_func=etag_func, last_modified_func=last_modified_func)
+
+
+def catalog_validators(request, *args, **kwargs):
+    # The row count catches deletes, the newest updated_at catches everything else. No
+    # Last-Modified: the newest updated_at stays put when a plan is deleted, so
+    # If-Modified-Since alone would answer 304 for a list that lost a row
+    state = HousePlan.objects.order_by().aggregate(count=Count('id'), last_modified=Max('updated_at'))
+    if state['last_modified'] is None:
+        return None
+    return make_etag(request, state['count'], state['last_modified'].isoformat()), None
+
+
+def plan_validators(request, pk, *args, **kwargs):
+    last_modified = HousePlan.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if last_modified is None:
+        return None
+    return make_etag(request, last_modified.isoformat()), last_modified
+
+
+def site_settings_validators(request, *args, **kwargs):
+    # Served from the per-process copy, so revalidation costs no query
+    last_modified = SiteSettings.get_cached().updated_at
+    return make_etag(request, last_modified.isoformat()), last_modified
+
+
+def bootstrap_version():
+    """Content version of /api/bootstrap/, read from the cache versions without touching the database"""
+    parts = (get_version(CATALOG), get_version(SITE_SETTINGS), settings.YOCO_PUBLIC_KEY)
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+
+def bootstrap_validators(request, *args, **kwargs):
+    return make_etag(request, bootstrap_version()), None
+
+
+catalog_condition = conditional_on(catalog_validators)
+plan_condition = conditional_on(plan_validators)
+site_settings_condition = conditional_on(site_settings_validators)
+bootstrap_condition = conditional_on(bootstrap_validators)
@@ -0,0 +1,9 @@
+from django.utils.functional import SimpleLazyObject
+
+from .models import SiteSettings
+
+
+def site_settings(request):
+    """Expose the cached SiteSettings singleton to templates as {{ site_settings }}"""
+    # Lazy, so templates that never use it don't even check the cache version
+    return {'site_settings': SimpleLazyObject(SiteSettings.get_cached)}
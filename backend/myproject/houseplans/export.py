@@ -0,0 +1,77 @@
+"""
+Streaming catalog export in JSON Lines and CSV.
+
+Plans are read with QuerySet.iterator(chunk_size=...) and their relations
+are fetched per chunk, so memory stays flat whatever the catalog size.
+Lines use the list serializer shape, or the detail shape (floors, rooms,
+features and amenities included) when `nested` is set.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import fastpath
+from .models import HousePlan
+from .serializers import HousePlanListSerializer, HousePlanDetailSerializer
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def plan_documents(nested=False, chunk_size=None):
+    """Yield the serialized plans of the whole catalog in id order"""
+    chunk_size = chunk_size or settings.HOUSE_PLANS_EXPORT_CHUNK_SIZE
+    plans = HousePlan.objects.order_by('pk')
+    if fastpath.is_enabled('export_house_plans'):
+        row_serializer = fastpath.detail_serializer() if nested else fastpath.list_serializer()
+        rows = row_serializer.rows(plans).iterator(chunk_size=chunk_size)
+        # serialize() loads the nested rows of each chunk with one query per relation
+        for chunk in chunks(rows, chunk_size):
+            yield from row_serializer.serialize(chunk)
+    else:
+        serializer_class = HousePlanDetailSerializer if nested else HousePlanListSerializer
+        plans = plans.for_detail() if nested else plans.for_list()
+        # Since Django 4.1 prefetch_related() runs once per chunk of the iterator
+        for plan in plans.iterator(chunk_size=chunk_size):
+            yield serializer_class(plan).data
+
+
+def jsonl_lines(nested=False, chunk_size=None):
+    renderer = JSONRenderer()
+    for document in plan_documents(nested, chunk_size):
+        yield renderer.render(document) + b'\n'
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes, so rows can be streamed"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(nested=False, chunk_size=None):
+    """CSV rows with one column per serializer field; nested lists are JSON-encoded cells"""
+    serializer_class = HousePlanDetailSerializer if nested else HousePlanListSerializer
+    columns = serializer_class.Meta.fields
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for document in plan_documents(nested, chunk_size):
+        yield writer.writerow([
+            json.dumps(value, cls=JSONEncoder, separators=(',', ':'))
+            if isinstance(value, (list, dict)) else value
+            for value in (document[name] for name in columns)
+        ])
+
+
+# Export format -> (content type, line generator)
+EXPORT_FORMATS = {
+    'jsonl': ('application/x-ndjson', jsonl_lines),
+    'csv': ('text/csv; charset=utf-8', csv_lines),
+}
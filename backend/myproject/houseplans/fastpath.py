@@ -0,0 +1,149 @@
+"""
+Read-only fast path for the catalog serializers.
+
+`RowSerializer` mirrors a DRF ModelSerializer class but works on `values()`
+rows instead of model instances, and loads each nested relation with one
+`values()` query for all parents. Scalars pass through untouched; only the
+fields whose representation differs from the database value (decimals,
+datetimes and files) are converted, reusing the DRF field objects so the
+rendered JSON is byte-identical to the ModelSerializer output.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import serializers
+
+from .media import file_url_builder
+from .models import HousePlanImage
+from .serializers import (
+    build_srcset,
+    HousePlanListSerializer,
+    HousePlanDetailSerializer,
+    HousePlanImageSerializer,
+    ImageRenditionSerializer,
+    FloorSerializer,
+    RoomSerializer,
+    FeatureSerializer,
+    AmenitySerializer,
+)
+
+# Uploads that haven't reached storage yet (see houseplans.uploads) are left out of the payloads:
+# child rows by this condition, file columns by nulling them unless their status column is 'stored'
+STORED_ROWS = {HousePlanImage: Q(upload_status='stored')}
+UPLOAD_STATUS_COLUMNS = {'primary_image': 'primary_image_upload_status'}
+
+
+@lru_cache(maxsize=None)
+def field_converters(serializer_class):
+    """Representation functions for the fields whose JSON value differs from the database value"""
+    model = serializer_class.Meta.model
+    converters = {}
+    for name, field in serializer_class().fields.items():
+        if isinstance(field, serializers.FileField):
+            url = file_url_builder(model._meta.get_field(name).storage)
+            converters[name] = lambda value, url=url: url(value) if value else None
+        elif isinstance(field, (serializers.DecimalField, serializers.DateTimeField)):
+            converters[name] = field.to_representation
+    return converters
+
+
+class RowSerializer:
+    """Serialize values() rows with the field layout of a DRF ModelSerializer class"""
+
+    def __init__(self, serializer_class, fields=None, children=None):
+        self.model = serializer_class.Meta.model
+        self.fields = [name for name in serializer_class.Meta.fields if fields is None or name in fields]
+        # Nested field name -> (RowSerializer, foreign key column on the child model[, function
+        # turning the list of serialized children into the field value])
+        self.children = {name: child for name, child in (children or {}).items() if name in self.fields}
+        self.columns = [name for name in self.fields if name not in self.children]
+        self.status_columns = {name: UPLOAD_STATUS_COLUMNS[name] for name in self.columns if name in UPLOAD_STATUS_COLUMNS}
+        self.converters = field_converters(serializer_class)
+
+    def rows(self, queryset, *extra):
+        """values() queryset with the columns this serializer (and `extra`) need"""
+        columns = dict.fromkeys(['id', *extra, *self.columns, *self.status_columns.values()])
+        return queryset.prefetch_related(None).values(*columns)
+
+    def serialize(self, rows):
+        rows = list(rows)
+        parent_ids = [row['id'] for row in rows]
+        nested = {
+            name: child[0].fetch_grouped(child[1], parent_ids)
+            for name, child in self.children.items()
+        }
+        combine = {name: child[2] for name, child in self.children.items() if len(child) > 2}
+        converters = self.converters
+        status_columns = self.status_columns
+        data = []
+        for row in rows:
+            item = {}
+            for name in self.fields:
+                if name in nested:
+                    value = nested[name].get(row['id'], [])
+                    item[name] = combine[name](value) if name in combine else value
+                    continue
+                value = row[name]
+                if name in status_columns and row[status_columns[name]] != 'stored':
+                    value = None
+                converter = converters.get(name)
+                item[name] = converter(value) if converter is not None and value is not None else value
+            data.append(item)
+        return data
+
+    def fetch_grouped(self, fk, parent_ids):
+        """Serialize the children of all parents with one query, grouped by parent id"""
+        if not parent_ids:
+            return {}
+        queryset = (
+            self.model.objects.filter(STORED_ROWS.get(self.model, Q()), **{f'{fk}__in': parent_ids})
+            .order_by(*self.model._meta.ordering)
+        )
+        rows = list(self.rows(queryset, fk))
+        grouped = defaultdict(list)
+        for row, item in zip(rows, self.serialize(rows)):
+            grouped[row[fk]].append(item)
+        return grouped
+
+
+def image_serializer():
+    return RowSerializer(
+        HousePlanImageSerializer,
+        children={'srcset': (RowSerializer(ImageRenditionSerializer), 'house_plan_image_id', build_srcset)},
+    )
+
+
+def list_serializer(fields=None):
+    return RowSerializer(
+        HousePlanListSerializer,
+        fields,
+        children={
+            'images': (image_serializer(), 'house_plan_id'),
+            'primary_srcset': (RowSerializer(ImageRenditionSerializer), 'house_plan_id', build_srcset),
+        },
+    )
+
+
+def detail_serializer(fields=None):
+    floors = RowSerializer(
+        FloorSerializer,
+        children={'rooms': (RowSerializer(RoomSerializer), 'floor_id')},
+    )
+    return RowSerializer(
+        HousePlanDetailSerializer,
+        fields,
+        children={
+            'images': (image_serializer(), 'house_plan_id'),
+            'primary_srcset': (RowSerializer(ImageRenditionSerializer), 'house_plan_id', build_srcset),
+            'floors': (floors, 'house_plan_id'),
+            'features': (RowSerializer(FeatureSerializer), 'house_plan_id'),
+            'amenities': (RowSerializer(AmenitySerializer), 'house_plan_id'),
+        },
+    )
+
+
+def is_enabled(endpoint):
+    """Whether the fast path serves the named endpoint (see HOUSE_PLANS_FAST_SERIALIZATION)"""
+    return endpoint in settings.HOUSE_PLANS_FAST_SERIALIZATION
@@ -0,0 +1,88 @@
+import django_filters
+from django.db.models import Count, F, Max, Min, Q
+from django.db.models.functions import Lower
+
+from .models import HousePlan
+
+
+class HousePlanFilter(django_filters.FilterSet):
+    """Server-side filters for the house plan listings"""
+    display_on = django_filters.CharFilter(field_name='display_location')
+
+    bedrooms = django_filters.NumberFilter()
+    bedrooms_min = django_filters.NumberFilter(field_name='bedrooms', lookup_expr='gte')
+    bathrooms = django_filters.NumberFilter()
+    bathrooms_min = django_filters.NumberFilter(field_name='bathrooms', lookup_expr='gte')
+    garage = django_filters.NumberFilter()
+    garage_min = django_filters.NumberFilter(field_name='garage', lookup_expr='gte')
+    price_min = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    floor_area_min = django_filters.NumberFilter(field_name='total_floor_area', lookup_expr='gte')
+    floor_area_max = django_filters.NumberFilter(field_name='total_floor_area', lookup_expr='lte')
+
+    style = django_filters.CharFilter(lookup_expr='iexact')
+    property_type = django_filters.ChoiceFilter(choices=HousePlan.PROPERTY_TYPE_CHOICES)
+    status = django_filters.ChoiceFilter(choices=HousePlan.STATUS_CHOICES)
+
+    is_popular = django_filters.BooleanFilter()
+    is_best_selling = django_filters.BooleanFilter()
+    is_new = django_filters.BooleanFilter()
+    is_pet_friendly = django_filters.BooleanFilter()
+
+    # Facet name -> (grouped model field, query parameters that filter on it)
+    FACETS = {
+        'bedrooms': ('bedrooms', ('bedrooms', 'bedrooms_min')),
+        'bathrooms': ('bathrooms', ('bathrooms', 'bathrooms_min')),
+        'garage': ('garage', ('garage', 'garage_min')),
+        'style': ('style', ('style',)),
+        'property_type': ('property_type', ('property_type',)),
+        'status': ('status', ('status',)),
+    }
+    # Facets whose filter ignores case, so their values are grouped ignoring case too
+    CASE_INSENSITIVE_FACETS = ('style',)
+    FLAGS = ('is_popular', 'is_best_selling', 'is_new', 'is_pet_friendly')
+    PRICE_PARAMS = ('price_min', 'price_max')
+    FLOOR_AREA_PARAMS = ('floor_area_min', 'floor_area_max')
+
+    class Meta:
+        model = HousePlan
+        fields = []
+
+    def queryset_without(self, params):
+        """
+        The base queryset filtered by everything except `params`, so each
+        facet counts the values a client could still switch to.
+        """
+        data = self.data.copy()
+        for param in params:
+            data.pop(param, None)
+        filterset = type(self)(data, queryset=self.queryset)
+        filterset.is_valid()
+        return filterset.qs.order_by()
+
+    def facet_counts(self):
+        """One grouped aggregate query per facet"""
+        facets = {}
+        for name, (field, params) in self.FACETS.items():
+            queryset = self.queryset_without(params)
+            if name in self.CASE_INSENSITIVE_FACETS:
+                # One entry per value the filter treats as equal, labelled with one of its spellings
+                rows = (
+                    queryset.values(group=Lower(field))
+                    .annotate(value=Min(field), count=Count('id'))
+                    .order_by('group')
+                )
+            else:
+                rows = queryset.values(value=F(field)).annotate(count=Count('id')).order_by('value')
+            facets[name] = [{'value': row['value'], 'count': row['count']} for row in rows]
+
+        facets['flags'] = self.queryset_without(self.FLAGS).aggregate(
+            **{flag: Count('id', filter=Q(**{flag: True})) for flag in self.FLAGS}
+        )
+        facets['price'] = self.queryset_without(self.PRICE_PARAMS).aggregate(
+            min=Min('price'), max=Max('price')
+        )
+        facets['floor_area'] = self.queryset_without(self.FLOOR_AREA_PARAMS).aggregate(
+            min=Min('total_floor_area'), max=Max('total_floor_area')
+        )
+        return facets
@@ -0,0 +1,88 @@
+"""
+Image metadata recorded at upload time: dimensions, byte size, dominant
+colour and a low-quality image placeholder (LQIP).
+
+With S3 storage, reading `.width`/`.height` of an ImageField downloads the
+object, so these are computed once from the uploaded file and stored in
+columns the serializers return directly. The file is read by Pillow as it
+decodes, never copied into memory whole, and JPEGs are decoded at reduced
+scale since only a small sample is needed.
+"""
+import base64
+import io
+import os
+
+from PIL import ExifTags, Image, ImageOps
+
+from .models import HousePlan, HousePlanImage
+
+# Model -> metadata key -> model field
+FIELDS = {
+    HousePlanImage: {
+        'width': 'width',
+        'height': 'height',
+        'byte_size': 'byte_size',
+        'dominant_color': 'dominant_color',
+        'lqip': 'lqip',
+    },
+    HousePlan: {
+        'width': 'primary_image_width',
+        'height': 'primary_image_height',
+        'byte_size': 'primary_image_size',
+        'dominant_color': 'primary_image_color',
+        'lqip': 'primary_image_lqip',
+    },
+}
+EMPTY = {'width': None, 'height': None, 'byte_size': None, 'dominant_color': '', 'lqip': ''}
+
+LQIP_WIDTH = 16
+PALETTE_SIZE = 5
+SAMPLE_SIZE = 64
+# EXIF orientations that rotate the image by 90 degrees
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def file_size(file):
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size
+
+
+def image_metadata(file):
+    """Metadata of an encoded image, from a seekable binary file"""
+    byte_size = file_size(file)
+    with Image.open(file) as original:
+        # Report the dimensions the image is displayed at, after EXIF rotation
+        width, height = original.size
+        if original.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        # Lets the JPEG decoder skip to a smaller scale that still covers the sample
+        original.draft('RGB', (SAMPLE_SIZE, SAMPLE_SIZE))
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    file.seek(0)
+
+    # The most common colour of a small palette-reduced copy
+    sample = image.resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BILINEAR).quantize(colors=PALETTE_SIZE)
+    _, index = max(sample.getcolors())
+    palette = sample.getpalette()
+    dominant = '#{:02x}{:02x}{:02x}'.format(*palette[index * 3:index * 3 + 3])
+
+    placeholder = image.resize((LQIP_WIDTH, max(1, round(height * LQIP_WIDTH / width))), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    placeholder.save(buffer, format='JPEG', quality=40)
+    return {
+        'width': width,
+        'height': height,
+        'byte_size': byte_size,
+        'dominant_color': dominant,
+        'lqip': 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode(),
+    }
+
+
+def apply_metadata(instance, metadata):
+    """Set the metadata columns of a plan image or plan; returns the names of the fields set"""
+    fields = FIELDS[type(instance)]
+    for key, field in fields.items():
+        setattr(instance, field, metadata[key])
+    return list(fields.values())
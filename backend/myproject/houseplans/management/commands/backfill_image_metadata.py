@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from houseplans.image_metadata import apply_metadata, image_metadata
+from houseplans.models import HousePlan, HousePlanImage
+from houseplans.renditions import rendition_owner
+from houseplans.signals import refresh_plans
+
+
+def read_metadata(instance):
+    """Read the original once and compute its metadata (runs in the thread pool)"""
+    _, source = rendition_owner(instance)
+    with source.open('rb') as file:
+        return image_metadata(file)
+
+
+class Command(BaseCommand):
+    help = 'Record dimensions, byte size, dominant colour and placeholder of images uploaded before they were tracked'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent storage reads')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows written per bulk update')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        targets = [
+            (HousePlanImage, HousePlanImage.objects.exclude(image='').filter(width__isnull=True)),
+            (HousePlan, HousePlan.objects.exclude(Q(primary_image='') | Q(primary_image__isnull=True))
+             .filter(primary_image_width__isnull=True)),
+        ]
+        plan_ids = set()
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for model, queryset in targets:
+                instances = list(queryset)
+                for offset in range(0, len(instances), options['batch_size']):
+                    batch = instances[offset:offset + options['batch_size']]
+                    futures = [pool.submit(read_metadata, instance) for instance in batch]
+                    updated, fields = [], []
+                    for instance, future in zip(batch, futures):
+                        try:
+                            fields = apply_metadata(instance, future.result())
+                        except OSError as e:
+                            self.stderr.write(f'Skipping {rendition_owner(instance)[1].name}: {e}')
+                            failed += 1
+                            continue
+                        updated.append(instance)
+                        plan_ids.add(instance.house_plan_id if model is HousePlanImage else instance.pk)
+                    if updated:
+                        model.objects.bulk_update(updated, fields)
+                    done += len(updated)
+
+        if plan_ids:
+            # The metadata is part of the payloads, so the plans' validators have to move too
+            refresh_plans(plan_ids)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Recorded metadata of {done} images in {elapsed:.1f}s, {failed} could not be read'
+        ))
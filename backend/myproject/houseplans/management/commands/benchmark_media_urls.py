@@ -0,0 +1,45 @@
+import time
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from houseplans.media import file_url_builder
+from houseplans.models import HousePlanImageStorage
+
+
+class Command(BaseCommand):
+    help = 'Compare storage.url() with the precomputed-prefix URLs of houseplans.media'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100000, help='File names per run')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the fastest is reported')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        names = [f'house_plan_images/plan-{i}/front elevation {i}.jpg' for i in range(options['count'])]
+        # Configured like production S3 (public, custom domain); url() needs no network access
+        storages = {
+            'filesystem': FileSystemStorage(base_url='/media/'),
+            's3': HousePlanImageStorage(
+                bucket_name='benchmark', custom_domain='benchmark.s3.eu-north-1.amazonaws.com',
+                querystring_auth=False,
+            ),
+        }
+        self.stdout.write(f"{'storage':<11} {'url() (ns)':>11} {'builder (ns)':>13} {'speedup':>8} identical")
+        for label, storage in storages.items():
+            build = file_url_builder(storage)
+            url_time, urls = self.measure(storage.url, names)
+            build_time, built = self.measure(build, names)
+            self.stdout.write(
+                f'{label:<11} {url_time / len(names) * 1e9:>11.0f} {build_time / len(names) * 1e9:>13.0f} '
+                f'{url_time / build_time:>7.1f}x {urls == built}'
+            )
+
+    def measure(self, url, names):
+        best, urls = None, None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            urls = [url(name) for name in names]
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, urls
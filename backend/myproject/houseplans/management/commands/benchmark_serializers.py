@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from houseplans import fastpath
+from houseplans.models import HousePlan, HousePlanImage, Floor, Room, Feature, Amenity
+from houseplans.serializers import HousePlanListSerializer, HousePlanDetailSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare the DRF catalog serializers with the values() fast path on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Catalog sizes to test')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the fastest is reported')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        self.stdout.write(f"{'plans':>7} {'shape':<7} {'drf (ms)':>10} {'fast (ms)':>10} {'speedup':>8} identical")
+        for size in options['sizes']:
+            # Everything is created inside a transaction that is rolled back afterwards
+            with transaction.atomic():
+                self.create_catalog(size)
+                self.compare(size, 'list',
+                             lambda: HousePlanListSerializer(HousePlan.objects.for_list(), many=True).data,
+                             fastpath.list_serializer())
+                self.compare(size, 'detail',
+                             lambda: HousePlanDetailSerializer(HousePlan.objects.for_detail(), many=True).data,
+                             fastpath.detail_serializer())
+                transaction.set_rollback(True)
+
+    def measure(self, build):
+        best, payload = None, None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            payload = JSONRenderer().render(build())
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, payload
+
+    def compare(self, size, shape, drf_build, row_serializer):
+        drf_time, drf_payload = self.measure(drf_build)
+        fast_time, fast_payload = self.measure(
+            lambda: row_serializer.serialize(row_serializer.rows(HousePlan.objects.all()))
+        )
+        self.stdout.write(
+            f'{size:>7} {shape:<7} {drf_time * 1000:>10.1f} {fast_time * 1000:>10.1f} '
+            f'{drf_time / fast_time:>7.1f}x {drf_payload == fast_payload}'
+        )
+
+    def create_catalog(self, size):
+        plans = HousePlan.objects.bulk_create(
+            HousePlan(
+                title=f'Benchmark plan {i}',
+                description='Spacious family home with an open-plan kitchen and lounge. ' * 5,
+                price='1250000.00',
+                bedrooms=3,
+                bathrooms=2,
+                square_feet='180.50',
+                primary_image=f'house_plans/benchmark-{i}.jpg',
+            )
+            for i in range(size)
+        )
+        HousePlanImage.objects.bulk_create(
+            HousePlanImage(house_plan=plan, image=f'house_plan_images/benchmark-{plan.pk}-{n}.jpg', order=n)
+            for plan in plans for n in range(3)
+        )
+        floors = Floor.objects.bulk_create(
+            Floor(house_plan=plan, level=level, floor_area='90.00', bedrooms=1, order=n)
+            for plan in plans for n, level in enumerate(['ground', 'first'])
+        )
+        Room.objects.bulk_create(
+            Room(floor=floor, name=name, order=n)
+            for floor in floors for n, name in enumerate(['Bedroom', 'Bathroom', 'Lounge'])
+        )
+        Feature.objects.bulk_create(
+            Feature(house_plan=plan, name=f'Feature {n}', order=n) for plan in plans for n in range(2)
+        )
+        Amenity.objects.bulk_create(
+            Amenity(house_plan=plan, name=f'Amenity {n}', order=n) for plan in plans for n in range(2)
+        )
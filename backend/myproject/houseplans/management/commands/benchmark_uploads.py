@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+from boto3.s3.transfer import TransferConfig
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from houseplans.models import MB, HousePlanImageStorage
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare single-PUT uploads from memory with the multipart uploads of HousePlanImageStorage '
+        'streamed from disk, against S3 or an S3-compatible server such as MinIO'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint-url', default=getattr(settings, 'AWS_S3_ENDPOINT_URL', None),
+                            help='e.g. http://localhost:9000 for a local MinIO')
+        parser.add_argument('--bucket', default=getattr(settings, 'AWS_STORAGE_BUCKET_NAME', ''))
+        parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 100, 200], help='File sizes in MB')
+        parser.add_argument('--repeat', type=int, default=2, help='Runs per measurement; the fastest is reported')
+
+    def handle(self, *args, **options):
+        if not options['bucket']:
+            raise CommandError('--bucket is required when AWS_STORAGE_BUCKET_NAME is not set')
+        # Credentials come from the settings or the usual AWS_* environment variables
+        common = {
+            'endpoint_url': options['endpoint_url'],
+            'bucket_name': options['bucket'],
+            'location': 'upload-benchmark',
+            'file_overwrite': True,
+        }
+        single_put = S3Boto3Storage(
+            **common, transfer_config=TransferConfig(multipart_threshold=max(options['sizes']) * MB + 1, use_threads=False)
+        )
+        multipart = HousePlanImageStorage(**common)
+        self.repeat = options['repeat']
+
+        self.stdout.write(
+            f"{'MB':>5} {'single PUT (MB/s)':>18} {'peak (MB)':>10} {'multipart (MB/s)':>17} {'peak (MB)':>10} {'speedup':>8}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for size in options['sizes']:
+                path = os.path.join(directory, f'{size}mb.bin')
+                with open(path, 'wb') as file:
+                    for _ in range(size):
+                        file.write(os.urandom(MB))
+
+                def from_memory():
+                    with open(path, 'rb') as file:
+                        return single_put.save(f'{size}mb.bin', ContentFile(file.read()))
+
+                def from_disk():
+                    with open(path, 'rb') as file:
+                        return multipart.save(f'{size}mb.bin', File(file))
+
+                single_time, single_peak = self.measure(from_memory)
+                multi_time, multi_peak = self.measure(from_disk)
+                multipart.delete(f'{size}mb.bin')
+                self.stdout.write(
+                    f'{size:>5} {size / single_time:>18.1f} {single_peak / MB:>10.1f} '
+                    f'{size / multi_time:>17.1f} {multi_peak / MB:>10.1f} {single_time / multi_time:>7.1f}x'
+                )
+
+    def measure(self, upload):
+        """Fastest wall time and the largest Python heap peak of the runs"""
+        best, peak = None, 0
+        for _ in range(self.repeat):
+            tracemalloc.start()
+            start = time.perf_counter()
+            upload()
+            elapsed = time.perf_counter() - start
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            best = elapsed if best is None else min(best, elapsed)
+        return best, peak
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from houseplans.export import EXPORT_FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Write the whole house plan catalog as JSON Lines or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl', dest='export_format')
+        parser.add_argument('--nested', action='store_true', help='Include floors, rooms, features and amenities')
+        parser.add_argument('--output', help='File to write to; standard output by default')
+        parser.add_argument('--chunk-size', type=int, default=settings.HOUSE_PLANS_EXPORT_CHUNK_SIZE,
+                            help='Plans read per database round trip')
+
+    def handle(self, *args, **options):
+        _, lines = EXPORT_FORMATS[options['export_format']]
+        output = open(options['output'], 'wb') if options['output'] else None
+        try:
+            count = 0
+            for line in lines(options['nested'], options['chunk_size']):
+                line = line if isinstance(line, bytes) else line.encode()
+                if output:
+                    output.write(line)
+                else:
+                    self.stdout.write(line.decode(), ending='')
+                count += 1
+        finally:
+            if output:
+                output.close()
+        if output:
+            self.stderr.write(self.style.SUCCESS(f"Wrote {count} lines to {options['output']}"))
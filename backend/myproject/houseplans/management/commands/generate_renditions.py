@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from houseplans.models import HousePlan, HousePlanImage
+from houseplans.rendering import render_renditions
+from houseplans.renditions import (
+    missing_renditions, rendition_owner, save_renditions, stale_renditions, supported_formats,
+)
+from houseplans.signals import refresh_plans
+
+
+class Command(BaseCommand):
+    help = 'Generate the missing WebP/AVIF renditions of plan images and primary images in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Encoding processes')
+        parser.add_argument('--all', action='store_true', help='Regenerate renditions that already exist')
+        parser.add_argument('--images', type=int, nargs='+', metavar='ID',
+                            help='Only render these plan images, e.g. the ones an import just added')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stale_rows = stale_renditions()
+        # Plans that only lose stale renditions change their payload too
+        plan_ids = {
+            plan_id
+            for pair in stale_rows.values_list('house_plan_image__house_plan_id', 'house_plan_id')
+            for plan_id in pair if plan_id is not None
+        }
+        stale, _ = stale_rows.delete()
+        if options['images']:
+            targets = list(HousePlanImage.objects.filter(pk__in=options['images']).exclude(image=''))
+        elif options['all']:
+            targets = list(HousePlanImage.objects.exclude(image='')) + list(
+                HousePlan.objects.exclude(primary_image='').exclude(primary_image__isnull=True)
+            )
+        else:
+            targets = missing_renditions()
+
+        arguments = (settings.IMAGE_RENDITION_WIDTHS, supported_formats(), settings.IMAGE_RENDITION_QUALITY)
+        workers = max(1, options['workers'])
+        written = 0
+        # Originals are read here and only encoded in the pool, with a bounded
+        # number in flight so memory doesn't grow with the catalog. Workers are
+        # spawned on every platform and Python version, and only import the
+        # Django-free houseplans.rendering
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = {}
+            for instance in targets:
+                _, source = rendition_owner(instance)
+                try:
+                    with source.open('rb') as file:
+                        pending[pool.submit(render_renditions, file.read(), *arguments)] = instance
+                except OSError as e:
+                    self.stderr.write(f'Skipping {source.name}: {e}')
+                    continue
+                if len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        written += self.save(pending.pop(future), future, plan_ids)
+            for future in wait(pending).done:
+                written += self.save(pending[future], future, plan_ids)
+
+        if plan_ids:
+            refresh_plans(plan_ids)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} renditions for {len(targets)} images in {elapsed:.1f}s '
+            f'({len(targets) / elapsed if elapsed else 0:.1f} images/s), removed {stale} stale'
+        ))
+
+    def save(self, instance, future, plan_ids):
+        try:
+            rendered = future.result()
+        except OSError as e:
+            # Pillow raises OSError subclasses for unreadable or truncated images
+            self.stderr.write(f'Skipping {rendition_owner(instance)[1].name}: {e}')
+            return 0
+        plan_ids.add(instance.house_plan_id if isinstance(instance, HousePlanImage) else instance.pk)
+        return save_renditions(instance, rendered)
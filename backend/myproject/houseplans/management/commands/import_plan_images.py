@@ -0,0 +1,188 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+
+from houseplans.image_metadata import EMPTY, apply_metadata, image_metadata
+from houseplans.models import MB, HousePlan, HousePlanImage
+from houseplans.signals import schedule_plan_refresh
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.avif', '.gif'}
+
+
+def directory_entries(root):
+    """(plan id, path, title, order) for every image in <root>/<plan id>/, in file name order"""
+    entries = []
+    for folder in sorted(os.listdir(root)):
+        directory = os.path.join(root, folder)
+        if not os.path.isdir(directory):
+            continue
+        if not folder.isdigit():
+            raise CommandError(f'Folder names must be house plan ids, got {folder!r}')
+        for name in sorted(os.listdir(directory)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                entries.append((int(folder), os.path.join(folder, name), '', None))
+    return entries
+
+
+def manifest_entries(path):
+    """(plan id, path, title, order) for each row of a CSV with plan, path and optional title and order columns"""
+    with open(path, newline='') as file:
+        reader = csv.DictReader(file)
+        missing = {'plan', 'path'} - set(reader.fieldnames or ())
+        if missing:
+            raise CommandError(f"Manifest is missing the {', '.join(sorted(missing))} column")
+        try:
+            return [
+                (int(row['plan']), row['path'], row.get('title') or '', int(row['order']) if row.get('order') else None)
+                for row in reader
+            ]
+        except ValueError as e:
+            raise CommandError(f'Invalid manifest row: {e}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Upload a batch of plan images to the configured storage and add them to their plans. '
+        'Takes a directory with one folder per plan id, or a CSV manifest'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory of <plan id>/ folders, or a CSV manifest (plan, path, title, order)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent uploads')
+        parser.add_argument('--journal', help='Progress file used to resume an interrupted import '
+                                              '(default: .import-journal.jsonl next to the source)')
+        parser.add_argument('--skip-renditions', action='store_true', help="Don't render the new images' renditions")
+
+    def handle(self, *args, **options):
+        source = os.path.abspath(options['source'])
+        if os.path.isdir(source):
+            root, entries = source, directory_entries(source)
+        elif os.path.isfile(source):
+            root, entries = os.path.dirname(source), manifest_entries(source)
+        else:
+            raise CommandError(f'{source} does not exist')
+        journal_path = options['journal'] or os.path.join(root, '.import-journal.jsonl')
+
+        plan_ids = {plan_id for plan_id, *_ in entries}
+        unknown = plan_ids - set(HousePlan.objects.filter(pk__in=plan_ids).values_list('pk', flat=True))
+        if unknown:
+            raise CommandError(f"Unknown house plan ids: {', '.join(map(str, sorted(unknown)))}")
+
+        start = time.perf_counter()
+        journal = self.read_journal(journal_path)
+        files = dict.fromkeys((plan_id, path) for plan_id, path, *_ in entries)
+        pending = [key for key in files if key not in journal]
+        uploaded, failed, size = self.upload(root, pending, journal, journal_path, options['workers'])
+        elapsed = time.perf_counter() - start
+        created = self.create_rows(entries, journal)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Uploaded {uploaded} images ({size / MB:.1f} MB) in {elapsed:.1f}s: '
+            f'{uploaded / elapsed if elapsed else 0:.1f} files/s, {size / MB / elapsed if elapsed else 0:.1f} MB/s. '
+            f'{len(files) - len(pending)} were uploaded by an earlier run, {failed} failed. Added {len(created)} images'
+        ))
+        if created and settings.IMAGE_RENDITIONS_ON_UPLOAD and not options['skip_renditions']:
+            call_command('generate_renditions', images=created, stdout=self.stdout, stderr=self.stderr)
+
+    def read_journal(self, path):
+        """(plan id, path) -> stored name and metadata of the files a previous run uploaded"""
+        journal = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    # The last line may be cut short by the interruption
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    journal[record['plan'], record['path']] = record
+        return journal
+
+    def upload(self, root, pending, journal, journal_path, workers):
+        """Upload the (plan id, path) files in a thread pool; returns the uploaded and failed counts and bytes"""
+        field = HousePlanImage._meta.get_field('image')
+        content_addressed = getattr(field.storage, 'content_addressed', False)
+
+        def upload_one(plan_id, path):
+            # The file is streamed from disk for its metadata and the upload
+            with open(os.path.join(root, path), 'rb') as file:
+                try:
+                    metadata = image_metadata(file)
+                except OSError:
+                    metadata = {**EMPTY, 'byte_size': os.fstat(file.fileno()).st_size}
+                file.seek(0)
+                name = field.generate_filename(HousePlanImage(house_plan_id=plan_id), os.path.basename(path))
+                try:
+                    if content_addressed:
+                        # References are only taken by create_rows, for the rows it actually adds
+                        name = field.storage.store(name, File(file))
+                    else:
+                        name = field.storage.save(name, File(file))
+                finally:
+                    # Content-addressed storage counts references in the database from this thread
+                    connection.close()
+            return {'plan': plan_id, 'path': path, 'name': name, 'metadata': metadata}
+
+        uploaded = failed = size = 0
+        # Each upload is journaled as soon as it finishes, so a rerun skips it
+        with open(journal_path, 'a') as journal_file, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(upload_one, *key): key for key in pending}
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # boto3 raises its own exception types, not just OSError
+                    self.stderr.write(f'Failed to upload {futures[future][1]}: {e}')
+                    failed += 1
+                    continue
+                journal_file.write(json.dumps(record) + '\n')
+                journal_file.flush()
+                journal[futures[future]] = record
+                uploaded += 1
+                size += record['metadata']['byte_size'] or 0
+        return uploaded, failed, size
+
+    def create_rows(self, entries, journal):
+        """bulk_create the rows of the uploaded files not added yet, ordered after each plan's images; returns their ids"""
+        plan_ids = {plan_id for plan_id, *_ in entries}
+        existing = set(
+            HousePlanImage.objects.filter(house_plan_id__in=plan_ids).values_list('house_plan_id', 'image')
+        )
+        next_order = {
+            plan_id: (last + 1 if last is not None else 0)
+            for plan_id, last in HousePlan.objects.filter(pk__in=plan_ids)
+            .annotate(last=Max('images__order')).values_list('pk', 'last')
+        }
+        images = []
+        for plan_id, path, title, order in entries:
+            record = journal.get((plan_id, path))
+            if record is None or (plan_id, record['name']) in existing:
+                continue
+            if order is None:
+                order = next_order[plan_id]
+            next_order[plan_id] = max(next_order[plan_id], order + 1)
+            image = HousePlanImage(house_plan_id=plan_id, image=record['name'], title=title, order=order)
+            apply_metadata(image, record['metadata'])
+            images.append(image)
+            existing.add((plan_id, record['name']))
+
+        storage = HousePlanImage._meta.get_field('image').storage
+        with transaction.atomic():
+            HousePlanImage.objects.bulk_create(images, batch_size=500)
+            if getattr(storage, 'content_addressed', False):
+                for name, references in Counter(image.image.name for image in images).items():
+                    storage.acquire(name, references)
+            # bulk_create sends no post_save, so the plans are refreshed here
+            for plan_id in {image.house_plan_id for image in images}:
+                schedule_plan_refresh(plan_id)
+        return [image.pk for image in images]
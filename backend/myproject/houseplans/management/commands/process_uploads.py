@@ -0,0 +1,40 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from houseplans.renditions import rendition_owner
+from houseplans.uploads import complete, mark_failed, pending_uploads, push
+
+
+class Command(BaseCommand):
+    help = 'Upload staged plan images whose background upload failed or was interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_UPLOAD_WORKERS, help='Concurrent uploads')
+        parser.add_argument(
+            '--include-uploading', action='store_true',
+            help="Also retry uploads still marked 'uploading' (only when no server process is running them, e.g. after a restart)",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        statuses = ('failed', 'uploading') if options['include_uploading'] else ('failed',)
+        instances = pending_uploads(statuses)
+        stored = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [(instance, pool.submit(push, instance)) for instance in instances]
+            # Only the storage copies run in the pool; the rows are updated here
+            for instance, future in futures:
+                try:
+                    stored_name = future.result()
+                except Exception as e:
+                    self.stderr.write(f'Failed to upload {rendition_owner(instance)[1].name}: {e}')
+                    mark_failed(instance)
+                    failed += 1
+                    continue
+                stored += complete(instance, stored_name)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Uploaded {stored} staged images in {elapsed:.1f}s, {failed} failed'))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from houseplans.signals import refresh_plans
+from houseplans.similarity import rebuild_similar_plans, similar_plan_lists
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed similar plans of every house plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=settings.HOUSE_PLANS_SIMILAR_COUNT, help='Neighbours stored per plan')
+
+    def handle(self, *args, **options):
+        before = similar_plan_lists()
+        count = rebuild_similar_plans(k=options['count'])
+        after = similar_plan_lists()
+        # Plans whose list changed get new validators, so conditional requests see it
+        changed = {pk for pk in before.keys() | after.keys() if before.get(pk) != after.get(pk)}
+        if changed:
+            refresh_plans(changed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed similar plans for {count} house plans, {len(changed)} of them changed'
+        ))
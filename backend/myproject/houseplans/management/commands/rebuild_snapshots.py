@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from houseplans.snapshots import rebuild_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pre-encoded detail snapshot of every house plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Plans rendered per bulk write')
+
+    def handle(self, *args, **options):
+        count = rebuild_snapshots(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} house plan snapshots'))
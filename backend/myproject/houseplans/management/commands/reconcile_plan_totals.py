@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from houseplans.signals import refresh_plans
+from houseplans.totals import update_plan_totals
+
+
+class Command(BaseCommand):
+    help = 'Recompute the floor area, floor, room and room category totals of every house plan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Plans recomputed per bulk write')
+
+    def handle(self, *args, **options):
+        changed = update_plan_totals(batch_size=options['batch_size'])
+        if changed:
+            # The totals are part of the payloads, so the plans' validators have to move too
+            refresh_plans(changed)
+        self.stdout.write(self.style.SUCCESS(f'Corrected the totals of {len(changed)} house plans'))
@@ -0,0 +1,46 @@
+"""
+Media URLs without a storage.url() call per file.
+
+Public files have deterministic URLs: a prefix fixed by the storage's
+settings plus the quoted file name. `file_url_builder` works the prefix
+out once per storage and process, and both the DRF serializers (through
+MediaImageField) and the values() fast path build URLs by concatenation.
+Signed or private storages keep going through storage.url().
+"""
+from functools import lru_cache
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+@lru_cache(maxsize=None)
+def file_url_builder(storage):
+    """
+    Return a function turning a stored file name into its URL. Public
+    storages get a precomputed prefix; anything else asks the storage.
+    """
+    if isinstance(storage, FileSystemStorage):
+        prefix = storage.base_url
+        return lambda name: prefix + filepath_to_uri(name).lstrip('/')
+    custom_domain = getattr(storage, 'custom_domain', None)
+    signed = getattr(storage, 'querystring_auth', True) or getattr(storage, 'cloudfront_signer', None)
+    if custom_domain and not signed:
+        location = getattr(storage, 'location', '')
+        prefix = f"{storage.url_protocol}//{custom_domain}/{location + '/' if location else ''}"
+        return lambda name: prefix + filepath_to_uri(name).lstrip('/')
+    return storage.url
+
+
+class MediaImageField(serializers.ImageField):
+    """ImageField whose URL comes from file_url_builder"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        if not getattr(self, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return value.name
+        url = file_url_builder(value.storage)(value.name)
+        request = self.context.get('request', None)
+        return request.build_absolute_uri(url) if request is not None else url
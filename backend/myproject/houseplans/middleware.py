@@ -0,0 +1,105 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .cache import get_cache, record
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*')
+
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header that the client hasn't refused with q=0"""
+    accepted = set()
+    for part in header.split(','):
+        match = ACCEPT_ENCODING_RE.fullmatch(part)
+        if not match:
+            continue
+        encoding, quality = match.group(1).lower(), match.group(2)
+        try:
+            if quality is not None and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(encoding)
+    return accepted
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.API_COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.API_COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class APICompressionMiddleware:
+    """
+    Content-negotiated brotli/gzip compression for JSON API responses.
+
+    Responses served from the response cache or a plan snapshot carry a
+    `compression_key`; their compressed body is stored in the cache under that
+    key and reused, so identical payloads are compressed once.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(request, response):
+            return response
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted or '*' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        content = response.content
+        compressed = None
+        variant_key = getattr(response, 'compression_key', None)
+        if variant_key:
+            variant_key = f'{variant_key}:{encoding}'
+            compressed = get_cache().get(variant_key)
+            if compressed is not None:
+                record('compression', 'variant_hits')
+        if compressed is None:
+            compressed = compress(content, encoding)
+            if variant_key:
+                get_cache().set(variant_key, compressed, settings.API_CACHE_TIMEOUT)
+
+        # Don't send a compressed body that ended up larger
+        if len(compressed) >= len(content):
+            return response
+
+        record('compression', 'responses')
+        record('compression', 'bytes_in', len(content))
+        record('compression', 'bytes_out', len(compressed))
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is a different representation, weaken the
+        # ETag like django.middleware.gzip.GZipMiddleware does
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+    def should_compress(self, request, response):
+        return (
+            request.path.startswith(settings.API_COMPRESSION_PATH_PREFIX)
+            and response.status_code == 200
+            and not response.streaming
+            and not response.has_header('Content-Encoding')
+            and response.get('Content-Type', '').startswith('application/json')
+            and len(response.content) >= settings.API_COMPRESSION_MIN_SIZE
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0012_purchase_yoco_reference_purchase_yoco_token'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(fields=['-created_at', '-id'], name='houseplan_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(fields=['display_location', '-created_at', '-id'], name='houseplan_location_created_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 09:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0013_houseplan_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HousePlanSnapshot',
+            fields=[
+                ('house_plan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='houseplans.houseplan')),
+                ('payload', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'House Plan Snapshot',
+                'verbose_name_plural': 'House Plan Snapshots',
+            },
+        ),
+    ]
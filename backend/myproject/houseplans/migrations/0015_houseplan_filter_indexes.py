@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0014_houseplansnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(fields=['display_location', 'bedrooms', 'bathrooms'], name='houseplan_location_rooms_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(fields=['display_location', 'price'], name='houseplan_location_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(fields=['display_location', 'property_type', 'status'], name='houseplan_location_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(condition=models.Q(('is_popular', True)), fields=['-created_at'], name='houseplan_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(condition=models.Q(('is_best_selling', True)), fields=['-created_at'], name='houseplan_best_selling_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(condition=models.Q(('is_new', True)), fields=['-created_at'], name='houseplan_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(condition=models.Q(('is_pet_friendly', True)), fields=['-created_at'], name='houseplan_pet_friendly_idx'),
+        ),
+    ]
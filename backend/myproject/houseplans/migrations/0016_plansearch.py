@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 09:40
+
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE houseplans_plansearch ('
+            'plan_id bigint PRIMARY KEY REFERENCES houseplans_houseplan (id) ON DELETE CASCADE, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX houseplans_plansearch_document_idx ON houseplans_plansearch USING GIN (document)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE houseplans_plansearch USING fts5('
+            "title, description, features, amenities, rooms, tokenize = 'porter unicode61')"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS houseplans_plansearch')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0015_houseplan_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
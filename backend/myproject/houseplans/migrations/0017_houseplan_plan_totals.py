@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0016_plansearch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='houseplan',
+            name='floor_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='houseplan',
+            name='room_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='houseplan',
+            name='room_type_counts',
+            field=models.JSONField(default=dict, editable=False, help_text='Room quantities per room category'),
+        ),
+        migrations.AddField(
+            model_name='houseplan',
+            name='total_floor_area',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(fields=['total_floor_area', 'id'], name='houseplan_floor_area_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(fields=['display_location', 'total_floor_area', 'id'], name='houseplan_location_area_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 09:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0017_houseplan_plan_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(help_text='1 for the closest plan')),
+                ('distance', models.FloatField()),
+                ('house_plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_plans', to='houseplans.houseplan')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='houseplans.houseplan')),
+            ],
+            options={
+                'verbose_name': 'Similar Plan',
+                'verbose_name_plural': 'Similar Plans',
+                'ordering': ['house_plan', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('house_plan', 'rank'), name='similarplan_unique_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0018_similarplan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='houseplan',
+            index=models.Index(condition=models.Q(('status', 'featured')), fields=['-created_at'], name='houseplan_featured_idx'),
+        ),
+    ]
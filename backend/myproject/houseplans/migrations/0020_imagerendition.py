@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 09:37
+
+import django.db.models.deletion
+import houseplans.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0019_houseplan_featured_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='similarplan',
+            options={'ordering': ['house_plan_id', 'rank'], 'verbose_name': 'Similar Plan', 'verbose_name_plural': 'Similar Plans'},
+        ),
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('avif', 'AVIF')], max_length=10)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('file', models.ImageField(storage=houseplans.models.HousePlanImageStorage(), upload_to='renditions/')),
+                ('source_name', models.CharField(help_text='Name of the original file this was rendered from', max_length=255)),
+                ('house_plan', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='primary_renditions', to='houseplans.houseplan')),
+                ('house_plan_image', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='houseplans.houseplanimage')),
+            ],
+            options={
+                'verbose_name': 'Image Rendition',
+                'verbose_name_plural': 'Image Renditions',
+                'ordering': ['format', 'width'],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('house_plan__isnull', True), ('house_plan_image__isnull', False)), models.Q(('house_plan__isnull', False), ('house_plan_image__isnull', True)), _connector='OR'), name='imagerendition_single_owner'), models.UniqueConstraint(fields=('house_plan_image', 'format', 'width'), name='imagerendition_unique_image_size'), models.UniqueConstraint(fields=('house_plan', 'format', 'width'), name='imagerendition_unique_primary_size')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0020_imagerendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='houseplan',
+            name='primary_image_color',
+            field=models.CharField(blank=True, editable=False, help_text='Dominant colour, #rrggbb', max_length=7),
+        ),
+        migrations.AddField(
+            model_name='houseplan',
+            name='primary_image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseplan',
+            name='primary_image_lqip',
+            field=models.TextField(blank=True, editable=False, help_text='Tiny blurred placeholder as a data URI'),
+        ),
+        migrations.AddField(
+            model_name='houseplan',
+            name='primary_image_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='houseplan',
+            name='primary_image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseplanimage',
+            name='byte_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseplanimage',
+            name='dominant_color',
+            field=models.CharField(blank=True, editable=False, help_text='#rrggbb', max_length=7),
+        ),
+        migrations.AddField(
+            model_name='houseplanimage',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseplanimage',
+            name='lqip',
+            field=models.TextField(blank=True, editable=False, help_text='Tiny blurred placeholder as a data URI'),
+        ),
+        migrations.AddField(
+            model_name='houseplanimage',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0021_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='houseplan',
+            name='primary_image_upload_status',
+            field=models.CharField(choices=[('stored', 'Stored'), ('uploading', 'Uploading'), ('failed', 'Upload failed')], default='stored', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='houseplanimage',
+            name='upload_status',
+            field=models.CharField(choices=[('stored', 'Stored'), ('uploading', 'Uploading'), ('failed', 'Upload failed')], default='stored', editable=False, max_length=10),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 09:50
+
+import houseplans.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0022_upload_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredObject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField(help_text='Bytes')),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Stored Object',
+                'verbose_name_plural': 'Stored Objects',
+            },
+        ),
+        migrations.AlterField(
+            model_name='houseplanimage',
+            name='image',
+            field=models.ImageField(storage=houseplans.models.plan_image_storage, upload_to='house_plan_images/'),
+        ),
+    ]
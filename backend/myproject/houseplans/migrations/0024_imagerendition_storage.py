@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 10:06
+
+import houseplans.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('houseplans', '0023_stored_objects'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagerendition',
+            name='file',
+            field=models.ImageField(storage=houseplans.models.rendition_storage, upload_to='renditions/'),
+        ),
+    ]
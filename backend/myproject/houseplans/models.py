@@ -1,12 +1,195 @@
-from django.db import models
+import hashlib
+import logging
+import os
+import posixpath
+import time
+
+from boto3.s3.transfer import TransferConfig
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models, transaction
 from django.conf import settings
 from storages.backends.s3boto3 import S3Boto3Storage
 
+from .cache import SITE_SETTINGS, get_version
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
 class HousePlanImageStorage(S3Boto3Storage):
     """Custom S3 storage for house plan images"""
     location = 'media'
     file_overwrite = False
 
+    def get_default_settings(self):
+        defaults = super().get_default_settings()
+        # Files above the threshold go up as multipart uploads with parts sent in parallel
+        defaults['transfer_config'] = TransferConfig(
+            multipart_threshold=settings.AWS_S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.AWS_S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=settings.AWS_S3_MAX_CONCURRENCY,
+        )
+        return defaults
+
+    def _save(self, name, content):
+        start = time.perf_counter()
+        name = super()._save(name, content)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            'Uploaded %s: %.1f MB in %.2fs (%.1f MB/s)',
+            name, content.size / MB, elapsed, content.size / MB / elapsed if elapsed else 0,
+        )
+        return name
+
+
+class ContentAddressedMixin:
+    """
+    Storage mixin that names each file after the SHA-256 of its content, so
+    identical uploads share one object. The file is hashed in chunks before
+    it is sent, an upload is skipped when the object is already stored, and
+    StoredObject counts the references so delete() only removes an object
+    once nothing uses it.
+    """
+    content_addressed = True
+
+    def get_available_name(self, name, max_length=None):
+        # _save picks the name from the content, so there is nothing to check here
+        return name
+
+    def _save(self, name, content):
+        return self.store(name, content, references=1)
+
+    def store(self, name, content, references=0):
+        """
+        Store `content` under its content name and add `references` to its
+        count. Bulk imports store with none and acquire() once rows use it.
+        """
+        digest, size = hashlib.sha256(), 0
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), digest.hexdigest()[:2], digest.hexdigest() + extension)
+
+        # The upload happens under the row lock: a concurrent save of the same
+        # content waits until the object exists, and a failed upload rolls the
+        # new row back instead of leaving it pointing at nothing
+        with transaction.atomic():
+            stored, created = StoredObject.objects.select_for_update().get_or_create(
+                name=name, defaults={'size': size}
+            )
+            # A file without a row predates content addressing or outlived a failed save
+            if created and not self.exists(name):
+                name = super()._save(name, content)
+            if references:
+                StoredObject.objects.filter(pk=stored.pk).update(refcount=models.F('refcount') + references)
+        return name
+
+    def acquire(self, name, references=1):
+        """Add references to an object stored with store()"""
+        StoredObject.objects.filter(name=name).update(refcount=models.F('refcount') + references)
+
+    def delete(self, name):
+        """Drop one reference; the object itself goes with the last one"""
+        self.release(name)
+
+    def release(self, name):
+        with transaction.atomic():
+            stored = StoredObject.objects.select_for_update().filter(name=name).first()
+            # Files without a row are not reference-counted and are left alone
+            if stored is None:
+                return
+            if stored.refcount > 1:
+                StoredObject.objects.filter(pk=stored.pk).update(refcount=models.F('refcount') - 1)
+                return
+            stored.delete()
+            # Removed while the row is locked, so a concurrent save of the same content re-uploads it
+            super().delete(name)
+
+
+class ContentAddressedS3Storage(ContentAddressedMixin, HousePlanImageStorage):
+    pass
+
+
+class ContentAddressedFileSystemStorage(ContentAddressedMixin, FileSystemStorage):
+    pass
+
+
+def plan_image_storage():
+    """Storage of plan images: S3 with USE_S3, content-addressed with IMAGE_STORAGE_CONTENT_ADDRESSED"""
+    if settings.USE_S3:
+        return ContentAddressedS3Storage() if settings.IMAGE_STORAGE_CONTENT_ADDRESSED else HousePlanImageStorage()
+    return ContentAddressedFileSystemStorage() if settings.IMAGE_STORAGE_CONTENT_ADDRESSED else default_storage
+
+
+def rendition_storage():
+    """Storage of image renditions: the plan image bucket with USE_S3, never content-addressed"""
+    return HousePlanImageStorage() if settings.USE_S3 else default_storage
+
+
+# Where an uploaded original is, see houseplans.uploads
+UPLOAD_STATUS_CHOICES = [
+    ('stored', 'Stored'),
+    ('uploading', 'Uploading'),
+    ('failed', 'Upload failed'),
+]
+
+
+class HousePlanQuerySet(models.QuerySet):
+    """Catalog querysets shaped for each house plan serializer"""
+
+    # Serializer field name -> prefetch lookup for the nested relations
+    LIST_RELATIONS = {'images': 'images__renditions', 'primary_srcset': 'primary_renditions'}
+    DETAIL_RELATIONS = {
+        'images': 'images__renditions',
+        'primary_srcset': 'primary_renditions',
+        'floors': 'floors__rooms',
+        'features': 'features',
+        'amenities': 'amenities_list',
+    }
+
+    # Homepage section -> condition matching one of the partial indexes below
+    HOME_SECTIONS = {
+        'popular': models.Q(is_popular=True),
+        'best_selling': models.Q(is_best_selling=True),
+        'new': models.Q(is_new=True),
+        'featured': models.Q(status='featured'),
+    }
+
+    def for_list(self, fields=None):
+        # HousePlanListSerializer only nests images and renditions
+        return self.project(fields, self.LIST_RELATIONS)
+
+    def built_homes(self):
+        return self.filter(display_location='built_plans_page')
+
+    def home_section(self, name):
+        """Newest first, so each section is a scan of its partial index"""
+        return self.filter(self.HOME_SECTIONS[name]).order_by('-created_at', '-id')
+
+    def for_detail(self, fields=None):
+        # HousePlanDetailSerializer nests images, renditions, floors -> rooms, features and amenities
+        return self.project(fields, self.DETAIL_RELATIONS)
+
+    def project(self, fields, relations):
+        """
+        Load only the columns and relations behind the requested serializer
+        fields. `fields=None` means the full serializer shape.
+        """
+        if fields is None:
+            return self.prefetch_related(*relations.values())
+        columns = [name for name in fields if name not in relations]
+        if 'primary_image' in columns:
+            # The serializers hide a primary image whose upload hasn't finished
+            columns.append('primary_image_upload_status')
+        lookups = [relations[name] for name in fields if name in relations]
+        # id and created_at are always needed for ordering and pagination cursors
+        return self.only('id', 'created_at', *columns).prefetch_related(*lookups)
+
+
 class HousePlan(models.Model):
     DISPLAY_LOCATION_CHOICES = [
         ('house_plans_page', 'House Plans Page'),
@@ -65,8 +248,21 @@ class HousePlan(models.Model):
     width_meters = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True, help_text="Width in meters")
     depth_meters = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True, help_text="Depth in meters")
     
+    # Computed from the floors and rooms by houseplans.totals, never edited by hand
+    total_floor_area = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    floor_count = models.PositiveIntegerField(default=0, editable=False)
+    room_count = models.PositiveIntegerField(default=0, editable=False)
+    room_type_counts = models.JSONField(default=dict, editable=False, help_text="Room quantities per room category")
+    
     # Media & Links
     primary_image = models.ImageField(upload_to='house_plans/', blank=True, null=True, help_text="Primary/thumbnail image")
+    # Recorded at upload by houseplans.image_metadata, so nothing has to open the file to know them
+    primary_image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    primary_image_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False, help_text="Bytes")
+    primary_image_color = models.CharField(max_length=7, blank=True, editable=False, help_text="Dominant colour, #rrggbb")
+    primary_image_lqip = models.TextField(blank=True, editable=False, help_text="Tiny blurred placeholder as a data URI")
+    primary_image_upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default='stored', editable=False)
     video_url = models.URLField(blank=True, null=True, help_text="YouTube video URL")
     
     # Features & Status
@@ -79,23 +275,57 @@ class HousePlan(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = HousePlanQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "House Plan"
         verbose_name_plural = "House Plans"
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination over (created_at, id), optionally per display location
+            models.Index(fields=['-created_at', '-id'], name='houseplan_created_idx'),
+            models.Index(fields=['display_location', '-created_at', '-id'], name='houseplan_location_created_idx'),
+            # Server-side catalog filters
+            models.Index(fields=['display_location', 'bedrooms', 'bathrooms'], name='houseplan_location_rooms_idx'),
+            models.Index(fields=['display_location', 'price'], name='houseplan_location_price_idx'),
+            models.Index(fields=['display_location', 'property_type', 'status'], name='houseplan_location_type_idx'),
+            # Sorting and filtering by the computed floor area
+            models.Index(fields=['total_floor_area', 'id'], name='houseplan_floor_area_idx'),
+            models.Index(fields=['display_location', 'total_floor_area', 'id'], name='houseplan_location_area_idx'),
+            # The flags are true for a small slice of the catalog, so only index those rows
+            models.Index(fields=['-created_at'], condition=models.Q(is_popular=True), name='houseplan_popular_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_best_selling=True), name='houseplan_best_selling_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_new=True), name='houseplan_new_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_pet_friendly=True), name='houseplan_pet_friendly_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(status='featured'), name='houseplan_featured_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
+    @property
+    def stored_images(self):
+        """The images whose upload has finished, from the prefetched images when there are any"""
+        return [image for image in self.images.all() if image.upload_status == 'stored']
+
+    @property
+    def stored_primary_image(self):
+        # While uploading, the primary image's URL points at an object that isn't there yet
+        return self.primary_image if self.primary_image_upload_status == 'stored' else None
+
 
 class HousePlanImage(models.Model):
     house_plan = models.ForeignKey(HousePlan, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(
-        upload_to='house_plan_images/',
-        storage=HousePlanImageStorage() if settings.USE_S3 else None
-    )
+    image = models.ImageField(upload_to='house_plan_images/', storage=plan_image_storage)
     title = models.CharField(max_length=200, blank=True, help_text="Image title or description")
     order = models.IntegerField(default=0, help_text="Order to display images")
+    # Recorded at upload by houseplans.image_metadata, so nothing has to open the file to know them
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    byte_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    dominant_color = models.CharField(max_length=7, blank=True, editable=False, help_text="#rrggbb")
+    lqip = models.TextField(blank=True, editable=False, help_text="Tiny blurred placeholder as a data URI")
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default='stored', editable=False)
     
     class Meta:
         ordering = ['order']
@@ -106,6 +336,43 @@ class HousePlanImage(models.Model):
         return f"{self.house_plan.title} - Image {self.order}"
 
 
+class ImageRendition(models.Model):
+    """Resized WebP/AVIF copy of a plan image or primary image, see houseplans.renditions"""
+    FORMAT_CHOICES = [
+        ('webp', 'WebP'),
+        ('avif', 'AVIF'),
+    ]
+    
+    # Exactly one of the two owners is set
+    house_plan_image = models.ForeignKey(HousePlanImage, on_delete=models.CASCADE, null=True, blank=True, related_name='renditions')
+    house_plan = models.ForeignKey(HousePlan, on_delete=models.CASCADE, null=True, blank=True, related_name='primary_renditions')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.ImageField(
+        upload_to='renditions/',
+        storage=rendition_storage
+    )
+    source_name = models.CharField(max_length=255, help_text="Name of the original file this was rendered from")
+    
+    class Meta:
+        ordering = ['format', 'width']
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(house_plan_image__isnull=False, house_plan__isnull=True)
+                | models.Q(house_plan_image__isnull=True, house_plan__isnull=False),
+                name='imagerendition_single_owner',
+            ),
+            models.UniqueConstraint(fields=['house_plan_image', 'format', 'width'], name='imagerendition_unique_image_size'),
+            models.UniqueConstraint(fields=['house_plan', 'format', 'width'], name='imagerendition_unique_primary_size'),
+        ]
+        verbose_name = "Image Rendition"
+        verbose_name_plural = "Image Renditions"
+    
+    def __str__(self):
+        return f"{self.width}w {self.format} of {self.source_name}"
+
+
 class Floor(models.Model):
     LEVEL_CHOICES = [
         ('ground', 'Ground Floor'),
@@ -187,6 +454,55 @@ class Room(models.Model):
         return f"{self.floor.house_plan.title} - {self.floor.get_level_display()} - {self.name}"
 
 
+class HousePlanSnapshot(models.Model):
+    """Pre-encoded HousePlanDetailSerializer payload, rebuilt whenever the plan changes"""
+    house_plan = models.OneToOneField(HousePlan, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    payload = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "House Plan Snapshot"
+        verbose_name_plural = "House Plan Snapshots"
+    
+    def __str__(self):
+        return f"Snapshot of house plan {self.house_plan_id}"
+
+
+class SimilarPlan(models.Model):
+    """Precomputed nearest neighbour of a house plan by specification, see houseplans.similarity"""
+    house_plan = models.ForeignKey(HousePlan, on_delete=models.CASCADE, related_name='similar_plans')
+    similar = models.ForeignKey(HousePlan, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField(help_text="1 for the closest plan")
+    distance = models.FloatField()
+    
+    class Meta:
+        # By the column, ordering by `house_plan` would join HousePlan for its Meta.ordering
+        ordering = ['house_plan_id', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['house_plan', 'rank'], name='similarplan_unique_rank'),
+        ]
+        verbose_name = "Similar Plan"
+        verbose_name_plural = "Similar Plans"
+    
+    def __str__(self):
+        return f"#{self.rank} similar to house plan {self.house_plan_id}"
+
+
+class StoredObject(models.Model):
+    """Reference count of a file in content-addressed storage, see ContentAddressedMixin"""
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(help_text="Bytes")
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Stored Object"
+        verbose_name_plural = "Stored Objects"
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+
 class QuoteRequest(models.Model):
     BUDGET_CHOICES = [
         ('under_500k', 'Under R500,000'),
@@ -285,6 +601,9 @@ class SiteSettings(models.Model):
     # Timestamps
     updated_at = models.DateTimeField(auto_now=True)
     
+    # (cache version, instance) held by get_cached()
+    _process_cache = None
+    
     class Meta:
         verbose_name = "Site Settings"
         verbose_name_plural = "Site Settings"
@@ -306,6 +625,21 @@ class SiteSettings(models.Model):
         # Get or create the singleton instance
         settings, created = cls.objects.get_or_create(pk=1)
         return settings
+    
+    @classmethod
+    def get_cached(cls):
+        """
+        The singleton from a per-process copy, reloaded whenever the site
+        settings cache version changes. Saves bump that version (see signals.py),
+        so every worker picks up an admin edit on its next read, and the steady
+        state costs one cache lookup and no query. Treat the result as read-only.
+        """
+        # Read the version before loading, so a save racing the load is seen next time
+        version = get_version(SITE_SETTINGS)
+        cached = cls._process_cache
+        if cached is None or cached[0] != version:
+            cached = cls._process_cache = (version, cls.get_settings())
+        return cached[1]
 
 
 class Purchase(models.Model):
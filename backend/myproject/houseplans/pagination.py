@@ -0,0 +1,143 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class HousePlanCursorPagination(BasePagination):
+    """
+    Opt-in keyset pagination for the house plan listings.
+
+    Pages are keyed on (created_at, id) by default, matching HousePlan.Meta.ordering, so
+    every page is a single index range scan instead of an OFFSET scan.
+    Pagination only kicks in when the client sends `cursor` or `page_size`.
+    `?ordering=` picks one of ORDERINGS, each ending in id so keys are unique.
+    Cursors record the ordering they were made for and only work with it.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+    ORDERINGS = {
+        'newest': ('-created_at', '-id'),
+        'floor_area': ('total_floor_area', 'id'),
+        '-floor_area': ('-total_floor_area', '-id'),
+    }
+    ordering_name = 'newest'
+    ordering = ORDERINGS[ordering_name]
+
+    def select_ordering(self, request):
+        """Apply the client's ?ordering=, which the cursors of the page then follow"""
+        name = request.query_params.get(self.ordering_query_param)
+        if name is None:
+            return self.ordering
+        if name not in self.ORDERINGS:
+            raise ValidationError({self.ordering_query_param: f"Choose one of: {', '.join(self.ORDERINGS)}"})
+        self.ordering_name, self.ordering = name, self.ORDERINGS[name]
+        return self.ordering
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        page_size = settings.HOUSE_PLANS_PAGE_SIZE
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            pass
+        return max(1, min(page_size, settings.HOUSE_PLANS_MAX_PAGE_SIZE))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        ordering = self.reversed_ordering() if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(ordering, cursor['position']))
+
+        # Fetch one extra row to find out whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next, self.has_previous = has_following, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def ordering_fields(self):
+        """Model fields a page's rows must carry to build cursors"""
+        return tuple(f.lstrip('-') for f in self.ordering)
+
+    def reversed_ordering(self):
+        return tuple(f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering)
+
+    def keyset_filter(self, ordering, position):
+        """Build `(a, b) < (x, y)` style row comparison for the given ordering"""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, obj, reverse):
+        # Pages hold model instances, or values() rows on the serialization fast path
+        get = obj.get if isinstance(obj, dict) else lambda name: getattr(obj, name)
+        position = [str(get(name)) for name in self.ordering_fields()]
+        payload = json.dumps({'o': self.ordering_name, 'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            # A position only means something in the ordering it was taken from
+            if payload['o'] != self.ordering_name:
+                raise ValueError('Cursor made for another ordering')
+            position = [
+                self.model._meta.get_field(f.lstrip('-')).to_python(value)
+                for f, value in zip(self.ordering, payload['p'], strict=True)
+            ]
+            reverse = bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return {'position': position, 'reverse': reverse}
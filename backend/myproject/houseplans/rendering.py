@@ -0,0 +1,36 @@
+"""
+Encoding of image renditions, see houseplans.renditions.
+
+Nothing here imports Django: generate_renditions runs `render_renditions`
+in spawned worker processes, which only import this module.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+# Pillow plugin feature name and save() options per rendition format
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'method': 4}),
+    'avif': ('avif', {'format': 'AVIF', 'speed': 6}),
+}
+
+
+def target_widths(original_width, widths):
+    """The configured widths narrower than the original, or just the original width if none are"""
+    return [width for width in sorted(widths) if width < original_width] or [original_width]
+
+
+def render_renditions(source, widths, formats, quality):
+    """Encode `source` (bytes or a binary file) at each width and format, returning (format, width, height, bytes) tuples"""
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    results = []
+    for width in target_widths(image.width, widths):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        for name in formats:
+            buffer = io.BytesIO()
+            resized.save(buffer, quality=quality[name], **FORMATS[name][1])
+            results.append((name, width, height, buffer.getvalue()))
+    return results
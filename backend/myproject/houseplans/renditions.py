@@ -0,0 +1,89 @@
+"""
+Responsive image renditions.
+
+Plan images and primary images are resized to IMAGE_RENDITION_WIDTHS and
+encoded in each of IMAGE_RENDITION_FORMATS that this Pillow build supports.
+The files go to the same storage as the originals, with one ImageRendition
+row each, and the serializers turn them into `srcset` strings.
+
+The encoding itself lives in houseplans.rendering, which doesn't import
+Django, so the backfill command's worker processes can load it.
+"""
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Q
+from PIL import features
+
+from .models import HousePlan, HousePlanImage, ImageRendition
+from .rendering import FORMATS, render_renditions
+
+
+def supported_formats():
+    return [name for name in settings.IMAGE_RENDITION_FORMATS if features.check(FORMATS[name][0])]
+
+
+def rendition_owner(instance):
+    """ImageRendition owner kwargs and source field of a plan image or plan"""
+    if isinstance(instance, HousePlanImage):
+        return {'house_plan_image': instance}, instance.image
+    return {'house_plan': instance}, instance.primary_image
+
+
+def save_renditions(instance, rendered):
+    """Replace the renditions of `instance` with the rendered (format, width, height, bytes) tuples"""
+    owner, source = rendition_owner(instance)
+    stem = os.path.splitext(os.path.basename(source.name))[0]
+    with transaction.atomic():
+        delete_renditions(instance)
+        renditions = []
+        for name, width, height, content in rendered:
+            rendition = ImageRendition(**owner, format=name, width=width, height=height, source_name=source.name)
+            rendition.file.save(f'{stem}-{width}w.{name}', ContentFile(content), save=False)
+            renditions.append(rendition)
+        ImageRendition.objects.bulk_create(renditions)
+    return len(renditions)
+
+
+def delete_renditions(instance):
+    # The files are removed by the ImageRendition post_delete signal
+    owner, _ = rendition_owner(instance)
+    ImageRendition.objects.filter(**owner).delete()
+
+
+def create_renditions(instance, file=None):
+    """
+    Render and store the renditions of a plan image or plan's primary image.
+    `file` is a local copy of the original when the caller has one, otherwise
+    the original is read back from storage.
+    """
+    _, source = rendition_owner(instance)
+    if not source:
+        delete_renditions(instance)
+        return 0
+    arguments = (settings.IMAGE_RENDITION_WIDTHS, supported_formats(), settings.IMAGE_RENDITION_QUALITY)
+    if file is None:
+        with source.open('rb') as file:
+            rendered = render_renditions(file, *arguments)
+    else:
+        rendered = render_renditions(file, *arguments)
+    return save_renditions(instance, rendered)
+
+
+def stale_renditions():
+    """Renditions made from a file their image or plan no longer uses"""
+    return ImageRendition.objects.exclude(
+        Q(house_plan_image__image=F('source_name')) | Q(house_plan__primary_image=F('source_name'))
+    )
+
+
+def missing_renditions():
+    """Plan images and plans with an original but no renditions made from it"""
+    images = HousePlanImage.objects.exclude(image='').exclude(renditions__source_name=F('image'))
+    plans = (
+        HousePlan.objects.exclude(primary_image='').exclude(primary_image__isnull=True)
+        .exclude(primary_renditions__source_name=F('primary_image'))
+    )
+    return list(images.distinct()) + list(plans.distinct())
@@ -0,0 +1,149 @@
+"""
+Full-text search over house plans.
+
+Each plan gets one row in the `houseplans_plansearch` table, created by
+migration 0016 for the database in use:
+
+* PostgreSQL: a weighted `tsvector` column with a GIN index
+* SQLite: an FTS5 virtual table keyed by the plan id
+
+Both match every term, the last one as a prefix so results follow the
+user's typing.
+
+The rows are refreshed incrementally from the catalog signals, so a search is
+a single indexed lookup. Other databases fall back to `icontains` filters.
+"""
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import HousePlan, Feature, Amenity, Room
+
+SEARCH_TABLE = 'houseplans_plansearch'
+
+# Columns of the search document, most relevant first
+DOCUMENT_COLUMNS = ('title', 'description', 'features', 'amenities', 'rooms')
+
+# PostgreSQL tsvector weights and SQLite bm25 weights per document column
+POSTGRES_WEIGHTS = {'title': 'A', 'description': 'B', 'features': 'C', 'amenities': 'C', 'rooms': 'D'}
+SQLITE_WEIGHTS = (10.0, 4.0, 2.0, 2.0, 1.0)
+
+
+def is_supported():
+    return connection.vendor in ('postgresql', 'sqlite')
+
+
+def build_documents(plan_ids):
+    """Collect the searchable text of each plan, one query per table"""
+    plans = HousePlan.objects.filter(pk__in=plan_ids).values_list('id', 'title', 'description')
+    documents = {plan_id: (title, description) for plan_id, title, description in plans}
+
+    related = defaultdict(list)
+    for plan_id, name in Feature.objects.filter(house_plan__in=documents).values_list('house_plan_id', 'name'):
+        related[plan_id, 'features'].append(name)
+    for plan_id, name in Amenity.objects.filter(house_plan__in=documents).values_list('house_plan_id', 'name'):
+        related[plan_id, 'amenities'].append(name)
+    for plan_id, name in Room.objects.filter(floor__house_plan__in=documents).values_list('floor__house_plan_id', 'name'):
+        related[plan_id, 'rooms'].append(name)
+
+    return {
+        plan_id: [title, description] + [' '.join(related[plan_id, column]) for column in DOCUMENT_COLUMNS[2:]]
+        for plan_id, (title, description) in documents.items()
+    }
+
+
+def update_search_index(plan_ids):
+    """Refresh the search rows of the given plans, removing rows of deleted plans"""
+    if not is_supported() or not plan_ids:
+        return
+    plan_ids = list(plan_ids)
+    documents = build_documents(plan_ids)
+    placeholders = ', '.join(['%s'] * len(plan_ids))
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            vector = ' || '.join(
+                f"setweight(to_tsvector('english', %s), '{POSTGRES_WEIGHTS[c]}')" for c in DOCUMENT_COLUMNS
+            )
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE plan_id IN ({placeholders})', plan_ids)
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (plan_id, document) VALUES (%s, {vector})',
+                [(plan_id, *values) for plan_id, values in documents.items()],
+            )
+        else:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})', plan_ids)
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(DOCUMENT_COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s)",
+                [(plan_id, *values) for plan_id, values in documents.items()],
+            )
+
+
+def rebuild_search_index(batch_size=500):
+    """Re-index the whole catalog and return the number of plans indexed"""
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    plan_ids = list(HousePlan.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(plan_ids), batch_size):
+        update_search_index(plan_ids[start:start + batch_size])
+    return len(plan_ids)
+
+
+def search_plan_ids(query, limit=None, display_location=None):
+    """
+    Return the ids of the plans matching `query`, best match first. The
+    display_location filter is part of the search query, so `limit` counts
+    only plans that pass it.
+    """
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return []
+    plan_table = HousePlan._meta.db_table
+    filter_sql = ' AND plan.display_location = %s' if display_location else ''
+    filter_params = [display_location] if display_location else []
+    limit_sql = ' LIMIT %s' if limit else ''
+    limit_params = [limit] if limit else []
+
+    if connection.vendor == 'postgresql':
+        # Terms are word characters only, so they can't carry tsquery operators; the last one is a prefix
+        tsquery = ' & '.join([*terms[:-1], terms[-1] + ':*'])
+        sql = (
+            f"SELECT indexed.plan_id FROM {SEARCH_TABLE} indexed JOIN {plan_table} plan ON plan.id = indexed.plan_id, "
+            "to_tsquery('english', %s) query "
+            f'WHERE indexed.document @@ query{filter_sql} '
+            'ORDER BY ts_rank(indexed.document, query) DESC, indexed.plan_id DESC' + limit_sql
+        )
+        params = [tsquery, *filter_params, *limit_params]
+    elif connection.vendor == 'sqlite':
+        # Quote every term so user input can't inject FTS5 syntax, and prefix-match the last one
+        match = ' '.join(f'"{term}"' for term in terms) + '*'
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        sql = (
+            f'SELECT {SEARCH_TABLE}.rowid FROM {SEARCH_TABLE} JOIN {plan_table} plan ON plan.id = {SEARCH_TABLE}.rowid '
+            f'WHERE {SEARCH_TABLE} MATCH %s{filter_sql} '
+            f'ORDER BY bm25({SEARCH_TABLE}, {weights}), {SEARCH_TABLE}.rowid DESC' + limit_sql
+        )
+        params = [match, *filter_params, *limit_params]
+    else:
+        return fallback_search_plan_ids(terms, limit, display_location)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def fallback_search_plan_ids(terms, limit=None, display_location=None):
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term) | Q(description__icontains=term)
+            | Q(features__name__icontains=term) | Q(amenities_list__name__icontains=term)
+            | Q(floors__rooms__name__icontains=term)
+        )
+    if display_location:
+        condition &= Q(display_location=display_location)
+    ids = HousePlan.objects.filter(condition).values_list('pk', flat=True).distinct()
+    return list(ids[:limit] if limit else ids)
@@ -1,10 +1,58 @@
+from django.db import models
 from rest_framework import serializers
-from .models import HousePlan, HousePlanImage, Floor, Room, Feature, Amenity, SiteSettings
+from .media import MediaImageField
+from .models import HousePlan, HousePlanImage, ImageRendition, Floor, Room, Feature, Amenity, SiteSettings
 
-class HousePlanImageSerializer(serializers.ModelSerializer):
+class SparseFieldsetMixin:
+    """Only keep the fields named in the optional `fields` keyword argument"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class MediaURLMixin:
+    """Serialize model image fields with MediaImageField, which skips storage.url() for public files"""
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: MediaImageField,
+    }
+
+
+class ImageRenditionSerializer(MediaURLMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ImageRendition
+        fields = ['format', 'width', 'height', 'file']
+
+
+def build_srcset(renditions):
+    """Group serialized renditions into one `srcset` string per format"""
+    srcset = {}
+    for rendition in sorted(renditions, key=lambda r: (r['format'], r['width'])):
+        srcset.setdefault(rendition['format'], []).append(f"{rendition['file']} {rendition['width']}w")
+    return {name: ', '.join(candidates) for name, candidates in srcset.items()}
+
+
+class SrcsetField(serializers.Field):
+    """Read-only `srcset` strings per format, built from a renditions relation"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, renditions):
+        return build_srcset(ImageRenditionSerializer(renditions.all(), many=True).data)
+
+
+class HousePlanImageSerializer(MediaURLMixin, serializers.ModelSerializer):
+    srcset = SrcsetField(source='renditions')
+    
     class Meta:
         model = HousePlanImage
-        fields = ['id', 'image', 'title', 'order']
+        fields = ['id', 'image', 'srcset', 'width', 'height', 'byte_size', 'dominant_color', 'lqip', 'title', 'order']
 
 class RoomSerializer(serializers.ModelSerializer):
     class Meta:
@@ -28,34 +76,43 @@ class AmenitySerializer(serializers.ModelSerializer):
         model = Amenity
         fields = ['id', 'name', 'description', 'order']
 
-class HousePlanListSerializer(serializers.ModelSerializer):
+class HousePlanListSerializer(SparseFieldsetMixin, MediaURLMixin, serializers.ModelSerializer):
     """Serializer for listing house plans (shorter format)"""
-    images = HousePlanImageSerializer(many=True, read_only=True)
+    images = HousePlanImageSerializer(source='stored_images', many=True, read_only=True)
+    primary_image = MediaImageField(source='stored_primary_image', read_only=True)
+    primary_srcset = SrcsetField(source='primary_renditions')
     
     class Meta:
         model = HousePlan
         fields = [
             'id', 'title', 'description', 'price', 'bedrooms', 'bathrooms',
             'garage', 'square_feet', 'width_meters', 'depth_meters',
-            'primary_image', 'images', 'style', 'status', 'is_popular',
-            'is_best_selling', 'is_new', 'is_pet_friendly'
+            'primary_image', 'primary_srcset', 'primary_image_width', 'primary_image_height',
+            'primary_image_size', 'primary_image_color', 'primary_image_lqip',
+            'images', 'style', 'status', 'is_popular', 'is_best_selling', 'is_new', 'is_pet_friendly',
+            'total_floor_area', 'floor_count', 'room_count', 'room_type_counts'
         ]
 
-class HousePlanDetailSerializer(serializers.ModelSerializer):
+class HousePlanDetailSerializer(SparseFieldsetMixin, MediaURLMixin, serializers.ModelSerializer):
     """Serializer for detailed house plan view"""
-    images = HousePlanImageSerializer(many=True, read_only=True)
+    images = HousePlanImageSerializer(source='stored_images', many=True, read_only=True)
+    primary_image = MediaImageField(source='stored_primary_image', read_only=True)
+    primary_srcset = SrcsetField(source='primary_renditions')
     floors = FloorSerializer(many=True, read_only=True)
     features = FeatureSerializer(many=True, read_only=True)
-    amenities = AmenitySerializer(many=True, read_only=True)
+    amenities = AmenitySerializer(source='amenities_list', many=True, read_only=True)
     
     class Meta:
         model = HousePlan
         fields = [
             'id', 'title', 'description', 'price', 'bedrooms', 'bathrooms',
             'garage', 'square_feet', 'width_meters', 'depth_meters',
-            'primary_image', 'video_url', 'images', 'floors', 'features', 'amenities',
+            'primary_image', 'primary_srcset', 'primary_image_width', 'primary_image_height',
+            'primary_image_size', 'primary_image_color', 'primary_image_lqip',
+            'video_url', 'images', 'floors', 'features', 'amenities',
             'property_type', 'land_size', 'style', 'status',
             'is_popular', 'is_best_selling', 'is_new', 'is_pet_friendly',
+            'total_floor_area', 'floor_count', 'room_count', 'room_type_counts',
             'created_at', 'updated_at'
         ]
 
@@ -0,0 +1,235 @@
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .cache import CATALOG, SITE_SETTINGS, bump_version
+from .image_metadata import EMPTY as EMPTY_METADATA, apply_metadata, image_metadata
+from .models import HousePlan, HousePlanImage, ImageRendition, Floor, Room, Feature, Amenity, SiteSettings
+from .renditions import create_renditions, delete_renditions, rendition_owner
+from .search import update_search_index
+from .similarity import SIMILARITY_FIELDS, update_similar_plans
+from .snapshots import rebuild_snapshots
+from .totals import update_plan_totals
+from . import uploads
+
+CATALOG_MODELS = (HousePlan, HousePlanImage, Floor, Room, Feature, Amenity)
+
+_local = threading.local()
+
+
+def _pending_plan_ids():
+    if not hasattr(_local, 'plan_ids'):
+        _local.plan_ids = set()
+    return _local.plan_ids
+
+
+def _pending_spec_ids():
+    if not hasattr(_local, 'spec_ids'):
+        _local.spec_ids = set()
+    return _local.spec_ids
+
+
+def plan_id_for(instance):
+    """Find the house plan a catalog row belongs to"""
+    if isinstance(instance, HousePlan):
+        return instance.pk
+    if isinstance(instance, Room):
+        return Floor.objects.filter(pk=instance.floor_id).values_list('house_plan_id', flat=True).first()
+    return instance.house_plan_id
+
+
+def schedule_plan_refresh(plan_id, specs_changed=False):
+    """
+    Queue a plan for refresh once the current transaction commits.
+
+    An admin save touches the plan and every inline row in one transaction,
+    so collecting the ids first means each plan is refreshed once. Similar
+    plans are only recomputed when `specs_changed`, since child rows don't
+    feed into them.
+    """
+    if plan_id is None:
+        return
+    _pending_plan_ids().add(plan_id)
+    if specs_changed:
+        _pending_spec_ids().add(plan_id)
+    transaction.on_commit(refresh_pending_plans)
+
+
+def refresh_pending_plans():
+    pending, pending_specs = _pending_plan_ids(), _pending_spec_ids()
+    plan_ids, spec_ids = set(pending), set(pending_specs)
+    pending.clear()
+    pending_specs.clear()
+    if plan_ids:
+        refresh_plans(plan_ids, spec_ids)
+
+
+def refresh_plans(plan_ids, spec_ids=()):
+    """
+    Bring everything derived from the given plans up to date. Management
+    commands that change what the API returns for a plan call this too, so
+    the plan's validators, snapshot and cached responses move with it.
+    """
+    update_plan_totals(plan_ids)
+    # updated_at doubles as the change marker for the plan's child rows
+    HousePlan.objects.filter(pk__in=plan_ids).update(updated_at=timezone.now())
+    rebuild_snapshots(plan_ids)
+    update_search_index(plan_ids)
+    if spec_ids:
+        update_similar_plans(spec_ids)
+    bump_version(CATALOG)
+
+
+def remember_spec_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Flag a new plan, or one whose similarity features are about to change"""
+    if raw or (update_fields is not None and not update_fields & set(SIMILARITY_FIELDS)):
+        return
+    if instance.pk is not None:
+        stored = HousePlan.objects.filter(pk=instance.pk).values(*SIMILARITY_FIELDS).first()
+        if stored is not None and all(stored[field] == getattr(instance, field) for field in SIMILARITY_FIELDS):
+            return
+    instance._specs_changed = True
+
+
+def catalog_changed(sender, instance, raw=False, signal=None, **kwargs):
+    # Fixture loading saves rows before their relations exist
+    if raw:
+        return
+    specs_changed = isinstance(instance, HousePlan) and (
+        signal is post_delete or instance.__dict__.pop('_specs_changed', False)
+    )
+    schedule_plan_refresh(plan_id_for(instance), specs_changed)
+
+
+pre_save.connect(remember_spec_change, sender=HousePlan)
+for model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=model)
+    post_delete.connect(catalog_changed, sender=model)
+
+
+def capture_upload(sender, instance, raw=False, **kwargs):
+    """
+    Record the metadata of a newly uploaded original, reading the upload
+    (a temporary file once it's over FILE_UPLOAD_MAX_MEMORY_SIZE) without
+    copying it into memory, and flag it for renditions. The renditions of a
+    cleared or replaced original are flagged for removal.
+    """
+    if raw:
+        return
+    _, source = rendition_owner(instance)
+    if not source:
+        apply_metadata(instance, EMPTY_METADATA)
+        instance._drop_renditions = instance.pk is not None
+        return
+    # An uncommitted file is an upload that pre_save is about to store
+    if source._committed:
+        return
+    instance._drop_renditions = instance.pk is not None
+    try:
+        apply_metadata(instance, image_metadata(source.file))
+    except OSError:
+        # Not an image Pillow can read; ImageField validation normally stops these earlier
+        apply_metadata(instance, {**EMPTY_METADATA, 'byte_size': source.size})
+        return
+    finally:
+        source.file.seek(0)
+    if settings.IMAGE_RENDITIONS_ON_UPLOAD:
+        instance._render_upload = True
+
+
+def drop_renditions(sender, instance, raw=False, **kwargs):
+    # Inside the save's transaction, so the plan refresh on commit snapshots the plan without them
+    if instance.__dict__.pop('_drop_renditions', False):
+        delete_renditions(instance)
+
+
+def render_upload(sender, instance, raw=False, **kwargs):
+    if not instance.__dict__.pop('_render_upload', False):
+        return
+
+    def render():
+        # Read back from storage after commit, so the request never holds the decoded original
+        create_renditions(instance)
+        schedule_plan_refresh(plan_id_for(instance))
+
+    if settings.IMAGE_RENDITIONS_IN_BACKGROUND:
+        transaction.on_commit(lambda: uploads.submit(render))
+    else:
+        transaction.on_commit(render)
+
+
+def stage_upload(sender, instance, raw=False, **kwargs):
+    """Divert a new upload to staging storage so the request doesn't wait for S3"""
+    if raw:
+        return
+    _, source = rendition_owner(instance)
+    if source and not source._committed and settings.IMAGE_UPLOAD_QUEUE:
+        uploads.stage(instance)
+        # The upload worker renders the renditions once the original is stored
+        instance.__dict__.pop('_render_upload', None)
+        instance._staged_upload = True
+    elif not source or not source._committed:
+        # Cleared, or about to be stored by pre_save itself
+        setattr(instance, uploads.STATUS_FIELDS[type(instance)], 'stored')
+
+
+def queue_upload(sender, instance, raw=False, **kwargs):
+    if instance.__dict__.pop('_staged_upload', False):
+        transaction.on_commit(lambda: uploads.enqueue(instance))
+
+
+def remember_replaced_original(sender, instance, raw=False, **kwargs):
+    # Content-addressed files are shared, so a replaced one is released rather than left behind
+    if raw or instance.pk is None or not getattr(instance.image.storage, 'content_addressed', False):
+        return
+    if not instance.image._committed:
+        instance._replaced_original = (
+            HousePlanImage.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        )
+
+
+def release_replaced_original(sender, instance, raw=False, **kwargs):
+    name = instance.__dict__.pop('_replaced_original', None)
+    if name:
+        storage = instance.image.storage
+        transaction.on_commit(lambda: storage.release(name))
+
+
+def release_original(sender, instance, **kwargs):
+    storage, name = instance.image.storage, instance.image.name
+    if name and getattr(storage, 'content_addressed', False):
+        transaction.on_commit(lambda: storage.release(name))
+
+
+pre_save.connect(remember_replaced_original, sender=HousePlanImage)
+post_save.connect(release_replaced_original, sender=HousePlanImage)
+post_delete.connect(release_original, sender=HousePlanImage)
+
+
+for model in (HousePlanImage, HousePlan):
+    # capture_upload reads the upload before stage_upload moves it
+    pre_save.connect(capture_upload, sender=model)
+    pre_save.connect(stage_upload, sender=model)
+    post_save.connect(drop_renditions, sender=model)
+    post_save.connect(render_upload, sender=model)
+    post_save.connect(queue_upload, sender=model)
+
+
+def rendition_deleted(sender, instance, **kwargs):
+    # Remove the file only once the row is gone for good
+    storage, name = instance.file.storage, instance.file.name
+    if name:
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+post_delete.connect(rendition_deleted, sender=ImageRendition)
+
+
+def site_settings_changed(sender, instance, raw=False, **kwargs):
+    transaction.on_commit(lambda: bump_version(SITE_SETTINGS))
+
+
+post_save.connect(site_settings_changed, sender=SiteSettings)
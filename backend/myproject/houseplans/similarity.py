@@ -0,0 +1,153 @@
+"""
+"Plans like this one" recommendations.
+
+Every plan becomes a row of a normalized NumPy feature matrix: z-scored
+specifications plus one-hot style and property type. The k nearest rows by
+Euclidean distance are precomputed in blocks of matrix products and stored
+as SimilarPlan rows, so the similar plans endpoint only reads the table.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import HousePlan, SimilarPlan
+
+NUMERIC_FEATURES = ['bedrooms', 'bathrooms', 'garage', 'square_feet', 'width_meters', 'depth_meters', 'price']
+CATEGORICAL_FEATURES = ['style', 'property_type']
+# Saving a plan only recomputes similar plans when one of these changed
+SIMILARITY_FIELDS = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+# A category mismatch adds the same squared distance as one standard deviation
+CATEGORY_WEIGHT = np.sqrt(0.5)
+BLOCK_SIZE = 1024
+
+
+def feature_matrix():
+    """Plan ids and their normalized feature rows, in id order"""
+    rows = list(HousePlan.objects.order_by('pk').values_list('pk', *NUMERIC_FEATURES, *CATEGORICAL_FEATURES))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    width = len(NUMERIC_FEATURES)
+    if not rows:
+        return ids, np.zeros((0, width))
+
+    numeric = np.array(
+        [[np.nan if value is None else float(value) for value in row[1:width + 1]] for row in rows],
+        dtype=np.float64,
+    ).reshape(len(rows), width)
+    # Missing values take the column mean, which makes them neutral after centering
+    known = ~np.isnan(numeric)
+    counts = known.sum(axis=0)
+    mean = np.where(counts > 0, np.where(known, numeric, 0).sum(axis=0) / np.maximum(counts, 1), 0)
+    numeric = np.where(known, numeric, mean)
+    std = numeric.std(axis=0)
+    numeric = (numeric - mean) / np.where(std > 0, std, 1)
+
+    columns = [numeric]
+    for offset, _ in enumerate(CATEGORICAL_FEATURES, start=width + 1):
+        values = [(row[offset] or '').strip().lower() for row in rows]
+        categories = sorted(set(values) - {''})
+        position = {value: i for i, value in enumerate(categories)}
+        one_hot = np.zeros((len(rows), len(categories)))
+        for i, value in enumerate(values):
+            if value:
+                one_hot[i, position[value]] = CATEGORY_WEIGHT
+        columns.append(one_hot)
+    return ids, np.hstack(columns)
+
+
+def squared_distances(a, b):
+    """Pairwise squared Euclidean distances between the rows of `a` and `b`"""
+    distances = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2 * a @ b.T
+    return np.maximum(distances, 0)
+
+
+def nearest_neighbours(matrix, rows, k):
+    """
+    Yield (row, neighbour rows, distances) with the k nearest rows of each of
+    `rows`, closest first. Distances are computed BLOCK_SIZE rows at a time
+    so memory stays bounded on large catalogs.
+    """
+    k = min(k, len(matrix) - 1)
+    if k <= 0:
+        return
+    rows = np.asarray(rows)
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = rows[start:start + BLOCK_SIZE]
+        distances = squared_distances(matrix[block], matrix)
+        distances[np.arange(len(block)), block] = np.inf
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        # Closest first, ties broken by row so rebuilds are deterministic
+        order = np.lexsort((candidates, candidate_distances), axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        candidate_distances = np.sqrt(np.take_along_axis(candidate_distances, order, axis=1))
+        yield from zip(block, candidates, candidate_distances)
+
+
+def write_neighbours(ids, matrix, rows, k, stale):
+    """Replace the `stale` SimilarPlan rows with the neighbours of the plans at `rows`"""
+    entries = [
+        SimilarPlan(house_plan_id=int(ids[row]), similar_id=int(ids[neighbour]), rank=rank, distance=float(distance))
+        for row, neighbours, distances in nearest_neighbours(matrix, rows, k)
+        for rank, (neighbour, distance) in enumerate(zip(neighbours, distances), start=1)
+    ]
+    with transaction.atomic():
+        stale.delete()
+        SimilarPlan.objects.bulk_create(entries, batch_size=1000)
+    return len(rows)
+
+
+def similar_plan_lists():
+    """Plan id -> the ids of its stored similar plans, closest first"""
+    lists = {}
+    for house_plan_id, similar_id in SimilarPlan.objects.order_by('house_plan_id', 'rank').values_list(
+        'house_plan_id', 'similar_id'
+    ):
+        lists.setdefault(house_plan_id, []).append(similar_id)
+    return lists
+
+
+def rebuild_similar_plans(k=None):
+    """Recompute the neighbours of every plan and return how many plans were processed"""
+    k = k or settings.HOUSE_PLANS_SIMILAR_COUNT
+    ids, matrix = feature_matrix()
+    return write_neighbours(ids, matrix, np.arange(len(ids)), k, SimilarPlan.objects.all())
+
+
+def update_similar_plans(plan_ids, k=None):
+    """
+    Incremental rebuild after the given plans changed or were deleted.
+
+    Recomputes the changed plans plus every plan whose stored list the change
+    can affect: lists that contain a changed plan, lists that are short (a
+    neighbour was deleted), and lists whose farthest neighbour is now farther
+    away than a changed plan. Normalization statistics drift slightly between
+    full rebuilds; rebuild_similar_plans resets them.
+    """
+    k = k or settings.HOUSE_PLANS_SIMILAR_COUNT
+    ids, matrix = feature_matrix()
+    if not len(ids):
+        return 0
+    index = {int(pk): row for row, pk in enumerate(ids)}
+    changed = [index[pk] for pk in plan_ids if pk in index]
+    expected = min(k, len(ids) - 1)
+
+    stored = {}
+    for house_plan_id, similar_id, distance in SimilarPlan.objects.values_list('house_plan_id', 'similar_id', 'distance'):
+        neighbours, farthest = stored.get(house_plan_id, ((), 0.0))
+        stored[house_plan_id] = ((*neighbours, similar_id), max(farthest, distance))
+
+    affected = set(changed)
+    plan_ids = set(plan_ids)
+    farthest = np.zeros(len(ids))
+    for pk, row in index.items():
+        neighbours, farthest[row] = stored.get(pk, ((), 0.0))
+        if len(neighbours) < expected or plan_ids.intersection(neighbours):
+            affected.add(row)
+    if changed:
+        closest_change = np.sqrt(squared_distances(matrix[changed], matrix).min(axis=0))
+        affected.update(np.flatnonzero(closest_change < farthest).tolist())
+    if not affected:
+        return 0
+    rows = sorted(affected)
+    stale = SimilarPlan.objects.filter(house_plan__in=[int(ids[row]) for row in rows])
+    return write_neighbours(ids, matrix, rows, k, stale)
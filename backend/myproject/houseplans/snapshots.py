@@ -0,0 +1,48 @@
+from rest_framework.renderers import JSONRenderer
+
+from .models import HousePlan, HousePlanSnapshot
+from .serializers import HousePlanDetailSerializer
+
+
+def render_snapshot(plan):
+    """Encode a plan exactly as the detail endpoint would render it"""
+    return JSONRenderer().render(HousePlanDetailSerializer(plan).data)
+
+
+def get_snapshot(pk):
+    """
+    Return the pre-encoded detail payload of a plan and a key identifying that
+    version of it, or (None, None) if the snapshot has not been built.
+    """
+    snapshot = HousePlanSnapshot.objects.filter(pk=pk).values_list('payload', 'updated_at').first()
+    if snapshot is None:
+        return None, None
+    payload, updated_at = snapshot
+    return bytes(payload), f'houseplans:snapshot:{pk}:{updated_at.timestamp()}'
+
+
+def get_snapshots(pks):
+    """Pre-encoded detail payloads of several plans in one query, keyed by plan id"""
+    snapshots = HousePlanSnapshot.objects.filter(pk__in=pks).values_list('pk', 'payload')
+    return {pk: bytes(payload) for pk, payload in snapshots}
+
+
+def rebuild_snapshots(plan_ids=None, batch_size=200):
+    """Rebuild the snapshots of the given plans (or the whole catalog) and return how many were written"""
+    plans = HousePlan.objects.order_by('pk')
+    if plan_ids is not None:
+        plans = plans.filter(pk__in=plan_ids)
+    ids = list(plans.values_list('pk', flat=True))
+
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        batch = HousePlan.objects.for_detail().filter(pk__in=ids[start:start + batch_size])
+        snapshots = [HousePlanSnapshot(house_plan=plan, payload=render_snapshot(plan)) for plan in batch]
+        HousePlanSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['house_plan'],
+            update_fields=['payload', 'updated_at'],
+        )
+        written += len(snapshots)
+    return written
@@ -1,3 +1,1195 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils.http import http_date
+from PIL import Image
+
+from .models import (
+    ContentAddressedFileSystemStorage, HousePlan, HousePlanImageStorage, HousePlanQuerySet, HousePlanImage, ImageRendition,
+    Floor, Room, Feature, Amenity, HousePlanSnapshot, SimilarPlan, SiteSettings, StoredObject,
+)
+from .cache import SITE_SETTINGS, bump_version, cache_stats, flush_stats
+from .export import jsonl_lines
+from .filters import HousePlanFilter
+from .management.commands.import_plan_images import Command as ImportPlanImagesCommand
+from .media import file_url_builder
+from .serializers import HousePlanDetailSerializer
+from .signals import schedule_plan_refresh
+from .similarity import rebuild_similar_plans
+from .uploads import staging_storage, upload_staged
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        # Cached responses, version counters and buffered statistics outlive the per-test database rollback
+        flush_stats()
+        cache.clear()
+        super().setUp()
+
+
+def create_plan(index, display_location='house_plans_page'):
+    """Create a house plan with two of every nested relation"""
+    # Run the commit hooks that refresh snapshots and other derived data
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        return _create_plan(index, display_location)
+
+
+def _create_plan(index, display_location):
+    plan = HousePlan.objects.create(
+        title=f'Plan {index}',
+        description='A house plan',
+        price='1500.00',
+        display_location=display_location,
+    )
+    for order in range(2):
+        HousePlanImage.objects.create(
+            house_plan=plan, image=f'house_plan_images/{index}-{order}.jpg', order=order
+        )
+        floor = Floor.objects.create(house_plan=plan, level='ground', floor_area='120.00', order=order)
+        Room.objects.create(floor=floor, name='Bedroom', quantity=2)
+        Room.objects.create(floor=floor, name='Kitchen')
+        Feature.objects.create(house_plan=plan, name=f'Feature {order}', order=order)
+        Amenity.objects.create(house_plan=plan, name=f'Amenity {order}', order=order)
+    return plan
+
+
+class CatalogQueryBudgetTests(CatalogTestCase):
+    """Each catalog endpoint runs a fixed number of queries regardless of catalog size"""
+
+    LIST_QUERIES = 5  # validators + plans + images + image renditions + primary renditions
+    DETAIL_QUERIES = 2  # validators + pre-encoded snapshot
+    # validators + snapshot miss + plan + images + image renditions + primary renditions
+    # + floors + rooms + features + amenities
+    DETAIL_FALLBACK_QUERIES = 10
+
+    def assert_budget(self, url, expected, sizes=(1, 10)):
+        created = 0
+        for size in sizes:
+            while created < size:
+                create_plan(created)
+                create_plan(created, display_location='built_plans_page')
+                created += 1
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_house_plans_list(self):
+        self.assert_budget(reverse('house_plans_list'), self.LIST_QUERIES)
+
+    def test_house_plans_list_filtered(self):
+        url = reverse('house_plans_list') + '?display_on=built_plans_page'
+        self.assert_budget(url, self.LIST_QUERIES)
+
+    def test_built_homes(self):
+        self.assert_budget(reverse('built_homes'), self.LIST_QUERIES)
+
+    def test_house_plan_detail(self):
+        plan = create_plan('detail')
+        url = reverse('house_plan_detail', args=[plan.pk])
+        self.assert_budget(url, self.DETAIL_QUERIES)
+
+    def test_house_plan_detail_without_snapshot(self):
+        plan = create_plan('fallback')
+        HousePlanSnapshot.objects.all().delete()
+        url = reverse('house_plan_detail', args=[plan.pk])
+        self.assert_budget(url, self.DETAIL_FALLBACK_QUERIES)
+
+    def test_detail_includes_amenities(self):
+        plan = create_plan('amenities')
+        response = self.client.get(reverse('house_plan_detail', args=[plan.pk]))
+        self.assertEqual([a['name'] for a in response.json()['amenities']], ['Amenity 0', 'Amenity 1'])
+        self.assertEqual(len(response.json()['floors'][0]['rooms']), 2)
+
+
+class CursorPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = [create_plan(i) for i in range(5)]
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            url = pages[-1]['next']
+        return pages
+
+    def test_pages_follow_catalog_ordering(self):
+        pages = self.walk(reverse('house_plans_list') + '?page_size=2')
+        ids = [plan['id'] for page in pages for plan in page['results']]
+        self.assertEqual(ids, [plan.pk for plan in reversed(self.plans)])
+        self.assertEqual([len(page['results']) for page in pages], [2, 2, 1])
+
+    def test_previous_cursor_returns_prior_page(self):
+        first = self.client.get(reverse('house_plans_list') + '?page_size=2').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+
+    def test_deep_page_query_budget(self):
+        pages = self.walk(reverse('house_plans_list') + '?page_size=1')
+        cache.clear()
+        with self.assertNumQueries(CatalogQueryBudgetTests.LIST_QUERIES):
+            self.client.get(pages[-2]['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('house_plans_list') + '?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_is_tied_to_its_ordering(self):
+        url = reverse('house_plans_list') + '?page_size=2&ordering=floor_area'
+        following = self.client.get(self.client.get(url).json()['next'])
+        self.assertEqual(following.status_code, 200)
+        mismatched = following.json()['next'].replace('ordering=floor_area', 'ordering=newest')
+        self.assertEqual(self.client.get(mismatched).status_code, 404)
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get(reverse('built_homes'))
+        self.assertEqual(response.json(), [])
+
+
+class SparseFieldsetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = create_plan(0)
+
+    def test_list_projection_skips_unrequested_relations(self):
+        url = reverse('house_plans_list') + '?fields=title,price,primary_image'
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(list(response.json()[0]), ['id', 'title', 'price', 'primary_image'])
+
+    def test_detail_projection(self):
+        url = reverse('house_plan_detail', args=[self.plan.pk]) + '?fields=title,floors'
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(list(response.json()), ['id', 'title', 'floors'])
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('built_homes') + '?fields=title,secret')
+        self.assertEqual(response.status_code, 400)
+
+
+class SnapshotTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = create_plan(0)
+        self.url = reverse('house_plan_detail', args=[self.plan.pk])
+
+    def fresh_payload(self):
+        plan = HousePlan.objects.for_detail().get(pk=self.plan.pk)
+        return HousePlanDetailSerializer(plan).data
+
+    def test_snapshot_matches_serializer(self):
+        self.assertEqual(self.client.get(self.url).json(), self.fresh_payload())
+
+    def test_nested_change_rebuilds_snapshot(self):
+        room = Room.objects.filter(floor__house_plan=self.plan).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            room.name = 'Study'
+            room.save()
+        payload = self.client.get(self.url).json()
+        self.assertEqual(payload['floors'][0]['rooms'][0]['name'], 'Study')
+        self.assertEqual(payload, self.fresh_payload())
+
+    def test_deleted_child_rebuilds_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.amenities_list.first().delete()
+        self.assertEqual(len(self.client.get(self.url).json()['amenities']), 1)
+
+    def test_deleted_plan(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class FilterAndFacetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        for index, (bedrooms, style, popular) in enumerate([(2, 'Modern', True), (3, 'Modern', False), (3, 'Farmhouse', True)]):
+            plan = create_plan(index)
+            HousePlan.objects.filter(pk=plan.pk).update(bedrooms=bedrooms, style=style, is_popular=popular)
+
+    def test_filters(self):
+        response = self.client.get(reverse('house_plans_list') + '?bedrooms=3&style=modern')
+        self.assertEqual([plan['bedrooms'] for plan in response.json()], [3])
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('house_plans_list') + '?property_type=castle')
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets_ignore_their_own_filter(self):
+        response = self.client.get(reverse('house_plans_list') + '?bedrooms=3&facets=1')
+        facets = response.json()['facets']
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(facets['bedrooms'], [{'value': 2, 'count': 1}, {'value': 3, 'count': 2}])
+        self.assertEqual(facets['style'], [{'value': 'Farmhouse', 'count': 1}, {'value': 'Modern', 'count': 1}])
+        self.assertEqual(facets['flags']['is_popular'], 1)
+
+    def test_facets_flag_must_be_true(self):
+        for value in ('0', 'false', 'no'):
+            self.assertNotIn('facets', self.client.get(reverse('house_plans_list'), {'facets': value, 'page_size': 2}).json())
+        self.assertIn('facets', self.client.get(reverse('house_plans_list'), {'facets': 'true'}).json())
+
+    def test_style_facet_groups_like_the_filter(self):
+        plan = create_plan(3)
+        HousePlan.objects.filter(pk=plan.pk).update(bedrooms=3, style='modern')
+        response = self.client.get(reverse('house_plans_list') + '?style=MODERN&facets=1')
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertEqual(
+            response.json()['facets']['style'], [{'value': 'Farmhouse', 'count': 1}, {'value': 'Modern', 'count': 3}]
+        )
+
+    def test_facet_query_budget(self):
+        # listing queries + one query per grouped facet, the flags, the price and floor area ranges
+        expected = CatalogQueryBudgetTests.LIST_QUERIES + len(HousePlanFilter.FACETS) + 3
+        with self.assertNumQueries(expected):
+            self.client.get(reverse('house_plans_list') + '?facets=1&page_size=2')
+
+
+class SearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plain = create_plan(0)
+        self.pool = create_plan(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(house_plan=self.pool, name='Heated swimming pool')
+            self.plain.title = 'Pool house cottage'
+            self.plain.save()
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('search_house_plans'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [plan['id'] for plan in response.json()]
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('pool'), [self.plain.pk, self.pool.pk])
+
+    def test_searches_nested_names(self):
+        self.assertEqual(self.search('swimming'), [self.pool.pk])
+        self.assertCountEqual(self.search('kitch'), [self.pool.pk, self.plain.pk])
+
+    def test_index_follows_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pool.features.filter(name__startswith='Heated').delete()
+        self.assertEqual(self.search('swimming'), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('"pool" OR NEAR('), [])
+
+    def test_display_filter_applies_before_the_limit(self):
+        built = create_plan(2, display_location='built_plans_page')
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(house_plan=built, name='Pool deck')
+        self.assertEqual(self.search('pool', limit=1, display_on='built_plans_page'), [built.pk])
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = create_plan(0)
+
+    def assert_revalidates(self, url, queries=1, last_modified=True):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['ETag'].startswith('"'))
+        self.assertEqual('Last-Modified' in response.headers, last_modified)
+        with self.assertNumQueries(queries):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        return response.headers['ETag']
+
+    def test_catalog_endpoints(self):
+        for url in (reverse('house_plans_list'), reverse('built_homes')):
+            self.assert_revalidates(url, last_modified=False)
+        self.assert_revalidates(reverse('house_plan_detail', args=[self.plan.pk]))
+
+    def test_site_settings(self):
+        # Validated from the per-process SiteSettings copy
+        self.assert_revalidates(reverse('get_site_settings'), queries=0)
+
+    def test_query_string_changes_etag(self):
+        url = reverse('house_plans_list')
+        self.assertNotEqual(
+            self.assert_revalidates(url, last_modified=False), self.assert_revalidates(url + '?bedrooms=1', last_modified=False)
+        )
+
+    def test_child_change_invalidates(self):
+        url = reverse('house_plans_list')
+        etag = self.assert_revalidates(url, last_modified=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.images.first().delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_then_revalidate(self):
+        newer = create_plan(1)
+        url = reverse('house_plans_list')
+        etag = self.client.get(url).headers['ETag']
+        # Deleting the older plan leaves the newest updated_at where it was
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.delete()
+        since = http_date(time.time() + 60)
+        self.assertEqual([plan['id'] for plan in self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).json()], [newer.pk])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ResponseCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = create_plan(0)
+
+    def test_hit_skips_view(self):
+        url = reverse('house_plans_list')
+        first = self.client.get(url)
+        with self.assertNumQueries(1):  # conditional GET validators only
+            second = self.client.get(url)
+        self.assertEqual(first.content, second.content)
+
+    def test_query_string_is_normalized(self):
+        self.client.get(reverse('house_plans_list') + '?bedrooms=1&style=modern')
+        with self.assertNumQueries(1):
+            self.client.get(reverse('house_plans_list') + '?style=modern&bedrooms=1')
+
+    def test_catalog_change_invalidates(self):
+        url = reverse('house_plan_detail', args=[self.plan.pk])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Feature.objects.create(house_plan=self.plan, name='Solar geyser', order=5)
+        self.assertEqual(self.client.get(url).json()['features'][-1]['name'], 'Solar geyser')
+
+    def test_site_settings_change_invalidates(self):
+        url = reverse('get_site_settings')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            site_settings = SiteSettings.get_settings()
+            site_settings.phone = '0123456789'
+            site_settings.save()
+        self.assertEqual(self.client.get(url).json()['phone'], '0123456789')
+
+    def test_stats_are_staff_only(self):
+        url = reverse('get_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.get(reverse('built_homes'))
+        self.client.get(reverse('built_homes'))
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        stats = self.client.get(url).json()['catalog']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_stats_are_buffered_between_flushes(self):
+        url = reverse('built_homes')
+        with mock.patch('houseplans.cache._incr') as incr:
+            self.client.get(url)
+            self.client.get(url)
+        incr.assert_not_called()
+        self.assertEqual((cache_stats()['catalog']['hits'], cache_stats()['catalog']['misses']), (1, 1))
+
+
+class FastPathTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = [create_plan(i) for i in range(3)]
+        HousePlan.objects.filter(pk=self.plans[0].pk).update(
+            primary_image='house_plans/front.jpg', square_feet='99.5', land_size=None,
+        )
+
+    def assert_identical(self, url):
+        fast = self.client.get(url).content
+        cache.clear()
+        with self.settings(HOUSE_PLANS_FAST_SERIALIZATION=[]):
+            drf = self.client.get(url).content
+        self.assertEqual(fast, drf)
+
+    def test_listings_match_model_serializers(self):
+        self.assert_identical(reverse('house_plans_list'))
+        self.assert_identical(reverse('house_plans_list') + '?page_size=2&fields=price,images')
+        self.assert_identical(reverse('search_house_plans') + '?q=kitchen')
+
+    def test_detail_matches_model_serializer(self):
+        HousePlanSnapshot.objects.all().delete()
+        for plan in self.plans:
+            self.assert_identical(reverse('house_plan_detail', args=[plan.pk]))
+
+
+class CompressionTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = [create_plan(i) for i in range(5)]
+        self.url = reverse('house_plans_list')
+
+    def test_negotiates_encoding(self):
+        plain = self.client.get(self.url)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+
+    def test_cached_variant_is_reused(self):
+        self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        stats = cache_stats()['compression']
+        self.assertEqual((stats['responses'], stats['variant_hits']), (2, 1))
+        self.assertGreater(stats['bytes_saved'], 0)
+
+    def test_small_responses_are_left_alone(self):
+        with self.settings(API_COMPRESSION_MIN_SIZE=10 ** 6):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response.headers)
+
+
+class BatchDetailTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = [create_plan(i) for i in range(4)]
+        self.url = reverse('house_plans_batch')
+
+    def test_preserves_order_and_reports_missing(self):
+        ids = [self.plans[2].pk, 9999, self.plans[0].pk]
+        HousePlanSnapshot.objects.filter(pk=self.plans[0].pk).delete()
+        response = self.client.get(self.url, {'ids': ','.join(map(str, ids))})
+        payload = response.json()
+        self.assertEqual([plan['id'] for plan in payload['results']], [self.plans[2].pk, self.plans[0].pk])
+        self.assertEqual(payload['missing'], [9999])
+        detail = self.client.get(reverse('house_plan_detail', args=[self.plans[0].pk])).json()
+        self.assertEqual(payload['results'][1], detail)
+
+    def test_shared_queries(self):
+        HousePlanSnapshot.objects.all().delete()
+        ids = ','.join(str(plan.pk) for plan in self.plans)
+        # validators + snapshots + plans + images + renditions x2 + floors + rooms + features + amenities
+        with self.assertNumQueries(10):
+            self.client.get(self.url, {'ids': ids})
+
+    def test_limits(self):
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, 400)
+        with self.settings(HOUSE_PLANS_BATCH_MAX_IDS=2):
+            self.assertEqual(self.client.get(self.url, {'ids': '1,2,3'}).status_code, 400)
+
+
+class CompareTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = [create_plan(i) for i in range(3)]
+        Room.objects.create(floor=self.plans[1].floors.first(), name='Study')
+        self.url = reverse('compare_house_plans')
+
+    def test_matrix_follows_requested_order(self):
+        ids = [self.plans[1].pk, self.plans[0].pk]
+        payload = self.client.get(self.url, {'ids': ','.join(map(str, ids))}).json()
+        self.assertEqual([plan['id'] for plan in payload['plans']], ids)
+        self.assertEqual(payload['specs']['price'], ['1500.00', '1500.00'])
+        self.assertEqual(payload['totals']['floor_count'], [2, 2])
+        self.assertEqual(payload['totals']['floor_area'], ['240.00', '240.00'])
+        self.assertEqual([floor['room_count'] for floor in payload['floors'][0]], [4, 3])
+        self.assertEqual(payload['room_types'], {'Bedroom': [4, 4], 'Kitchen': [2, 2], 'Study': [1, 0]})
+
+    def test_query_count_is_fixed(self):
+        ids = ','.join(str(plan.pk) for plan in self.plans)
+        # validators + plans + floor totals + floors + room types
+        with self.assertNumQueries(5):
+            self.assertEqual(self.client.get(self.url, {'ids': ids}).status_code, 200)
+
+    def test_limits(self):
+        self.assertEqual(self.client.get(self.url, {'ids': str(self.plans[0].pk)}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': ','.join(map(str, range(1, 8)))}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': f'{self.plans[0].pk},9999'}).status_code, 404)
+
+
+class PlanTotalsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = create_plan('totals')
+
+    def test_totals_follow_floor_and_room_changes(self):
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.total_floor_area, Decimal('240.00'))
+        self.assertEqual((self.plan.floor_count, self.plan.room_count), (2, 6))
+        self.assertEqual(self.plan.room_type_counts, {'bedroom': 4, 'kitchen': 2})
+
+        floor = self.plan.floors.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Room.objects.create(floor=floor, name='Guest En-suite')
+            floor.delete()
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.total_floor_area, Decimal('120.00'))
+        self.assertEqual((self.plan.floor_count, self.plan.room_count), (1, 3))
+        self.assertEqual(self.plan.room_type_counts, {'bedroom': 2, 'kitchen': 1})
+
+    def test_reconcile_command_repairs_drift(self):
+        HousePlan.objects.update(total_floor_area=0, room_count=0, room_type_counts={})
+        url = reverse('house_plans_list')
+        etag = self.client.get(url).headers['ETag']
+        out = StringIO()
+        call_command('reconcile_plan_totals', stdout=out)
+        self.assertIn('1 house plans', out.getvalue())
+        listed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(listed.status_code, 200)
+        self.assertEqual(listed.json()[0]['total_floor_area'], '240.00')
+        detail = self.client.get(reverse('house_plan_detail', args=[self.plan.pk])).json()
+        self.assertEqual((detail['total_floor_area'], detail['room_count']), ('240.00', 6))
+
+    def test_filter_and_order_by_floor_area(self):
+        small = create_plan('small')
+        with self.captureOnCommitCallbacks(execute=True):
+            small.floors.last().delete()
+        url = reverse('house_plans_list')
+        ids = [plan['id'] for plan in self.client.get(url, {'ordering': 'floor_area'}).json()]
+        self.assertEqual(ids, [small.pk, self.plan.pk])
+        pages = self.client.get(url, {'ordering': '-floor_area', 'page_size': 1}).json()
+        self.assertEqual(pages['results'][0]['id'], self.plan.pk)
+        self.assertEqual(self.client.get(pages['next']).json()['results'][0]['id'], small.pk)
+        filtered = self.client.get(url, {'floor_area_max': 150}).json()
+        self.assertEqual([plan['id'] for plan in filtered], [small.pk])
+        self.assertEqual(self.client.get(url, {'ordering': 'price'}).status_code, 400)
+
+
+class SimilarPlanTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = []
+        for index, (bedrooms, price, style) in enumerate([
+            (3, '1500.00', 'Modern'), (3, '1600.00', 'Modern'), (4, '2500.00', 'Modern'), (6, '9000.00', 'Farmhouse'),
+        ]):
+            plan = create_plan(index)
+            with self.captureOnCommitCallbacks(execute=True):
+                HousePlan.objects.filter(pk=plan.pk).update(bedrooms=bedrooms, price=price, style=style)
+                # Queryset updates skip the signals, so schedule the refresh by hand
+                schedule_plan_refresh(plan.pk, specs_changed=True)
+            self.plans.append(plan)
+
+    def similar_ids(self, plan):
+        response = self.client.get(reverse('similar_house_plans', args=[plan.pk]))
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()]
+
+    def test_closest_plans_first(self):
+        first, second, third, fourth = self.plans
+        self.assertEqual(self.similar_ids(first), [second.pk, third.pk, fourth.pk])
+
+    def test_incremental_update_matches_full_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            HousePlan.objects.filter(pk=self.plans[3].pk).update(bedrooms=3, price='1550.00', style='Modern')
+            schedule_plan_refresh(self.plans[3].pk, specs_changed=True)
+            self.plans[2].delete()
+        incremental = {plan.pk: self.similar_ids(plan) for plan in self.plans if plan is not self.plans[2]}
+        self.assertEqual(incremental[self.plans[0].pk][0], self.plans[3].pk)
+        rebuild_similar_plans()
+        cache.clear()
+        self.assertEqual({pk: self.similar_ids(HousePlan(pk=pk)) for pk in incremental}, incremental)
+
+    def test_only_spec_changes_recompute(self):
+        plan = HousePlan.objects.get(pk=self.plans[0].pk)
+        with mock.patch('houseplans.signals.update_similar_plans') as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                Floor.objects.create(house_plan=plan, level='first', floor_area='20.00', order=5)
+                plan.title = 'Renamed'
+                plan.save()
+            update.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                plan.bedrooms += 1
+                plan.save()
+            update.assert_called_once_with({plan.pk})
+
+    def test_rebuild_command_moves_the_validators(self):
+        first = self.plans[0]
+        # A drifted table, as if a plan had been edited without the signals
+        SimilarPlan.objects.filter(house_plan=first).delete()
+        url = reverse('similar_house_plans', args=[first.pk])
+        etag = self.client.get(url).headers['ETag']
+        call_command('rebuild_similar_plans', stdout=StringIO())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_served_from_table(self):
+        # validators + neighbour ids + plans + images + image renditions + primary renditions
+        with self.assertNumQueries(6):
+            self.similar_ids(self.plans[0])
+        self.assertEqual(self.client.get(reverse('similar_house_plans', args=[9999])).status_code, 404)
+
+
+class ExportTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = [create_plan(i) for i in range(3)]
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse('export_house_plans', args=[export_format]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_jsonl_matches_api_shapes(self):
+        lines = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual(lines, self.client.get(reverse('house_plans_list')).json()[::-1])
+        nested = json.loads(self.export('jsonl', nested=1).splitlines()[0])
+        detail = self.client.get(reverse('house_plan_detail', args=[self.plans[0].pk])).json()
+        self.assertEqual(nested, detail)
+
+    def test_csv_nested_cells_are_json(self):
+        rows = list(csv.DictReader(StringIO(self.export('csv', nested='true'))))
+        self.assertEqual([int(row['id']) for row in rows], [plan.pk for plan in self.plans])
+        self.assertEqual(len(json.loads(rows[0]['floors'])[0]['rooms']), 2)
+
+    def test_chunks_fetch_relations_once_each(self):
+        lines = jsonl_lines(nested=True, chunk_size=2)
+        # plans + images, both renditions, floors, rooms, features and amenities for each of the two chunks
+        with self.assertNumQueries(15):
+            self.assertEqual(len(list(lines)), 3)
+        with self.settings(HOUSE_PLANS_FAST_SERIALIZATION=[]):
+            self.assertEqual([line for line in jsonl_lines(nested=True, chunk_size=2)], list(jsonl_lines(nested=True)))
+
+    def test_command_and_unknown_format(self):
+        out = StringIO()
+        call_command('export_house_plans', '--format', 'csv', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertEqual(self.client.get(reverse('export_house_plans', args=['xml'])).status_code, 404)
+
+
+class HomeSectionTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plans = [create_plan(i) for i in range(4)]
+        HousePlan.objects.filter(pk__in=[self.plans[0].pk, self.plans[1].pk]).update(is_popular=True)
+        HousePlan.objects.filter(pk__in=[self.plans[1].pk, self.plans[2].pk, self.plans[3].pk]).update(is_new=True)
+        HousePlan.objects.filter(pk=self.plans[1].pk).update(status='featured')
+
+    def test_sections_share_serialized_plans(self):
+        payload = self.client.get(reverse('home_sections'), {'limit': 2}).json()
+        self.assertEqual(payload['sections'], {
+            'popular': [self.plans[1].pk, self.plans[0].pk],
+            'best_selling': [],
+            'new': [self.plans[3].pk, self.plans[2].pk],
+            'featured': [self.plans[1].pk],
+        })
+        self.assertCountEqual(payload['plans'], [str(plan.pk) for plan in self.plans])
+        self.assertEqual(payload['plans'][str(self.plans[1].pk)]['title'], 'Plan 1')
+
+    def test_query_budget(self):
+        # validators + one query per section + plans + images + image renditions
+        with self.assertNumQueries(1 + len(HousePlanQuerySet.HOME_SECTIONS) + 3):
+            self.client.get(reverse('home_sections'), {'fields': 'title,images'})
+
+
+class SiteSettingsCacheTests(CatalogTestCase):
+    def test_steady_state_runs_no_queries(self):
+        SiteSettings.get_cached()
+        with self.assertNumQueries(0):
+            SiteSettings.get_cached()
+        self.client.get(reverse('get_site_settings'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('get_site_settings')).status_code, 200)
+
+    def test_save_invalidates_every_process(self):
+        SiteSettings.get_cached()
+        # Another worker saving only reaches this one through the shared version
+        SiteSettings.objects.filter(pk=1).update(phone='0123456789')
+        self.assertEqual(SiteSettings.get_cached().phone, '')
+        bump_version(SITE_SETTINGS)
+        self.assertEqual(SiteSettings.get_cached().phone, '0123456789')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            site_settings = SiteSettings.get_settings()
+            site_settings.phone = '0987654321'
+            site_settings.save()
+        self.assertEqual(SiteSettings.get_cached().phone, '0987654321')
+
+    def test_version_never_repeats_after_cache_loss(self):
+        before = bump_version(SITE_SETTINGS)
+        cache.clear()
+        self.assertNotEqual(bump_version(SITE_SETTINGS), before)
+
+
+class BootstrapTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plan = create_plan(0)
+        HousePlan.objects.filter(pk=self.plan.pk).update(is_popular=True)
+        self.url = reverse('bootstrap')
+
+    def test_bundles_settings_key_and_catalog_state(self):
+        SiteSettings.get_cached()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        payload = response.json()
+        self.assertEqual(payload['yoco_public_key'], settings.YOCO_PUBLIC_KEY)
+        self.assertEqual(payload['site_settings'], self.client.get(reverse('get_site_settings')).json())
+        self.assertEqual(payload['catalog']['count'], 1)
+        self.assertEqual(payload['sections'], {'built_homes': 0, 'popular': 1, 'best_selling': 0, 'new': 0, 'featured': 0})
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+    def test_versioned_url_is_immutable_until_content_changes(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir.name}
+        with self.settings(CACHES={'default': file_cache}):
+            version = self.client.get(self.url).json()['version']
+            response = self.client.get(self.url, {'v': version})
+            self.assertIn('immutable', response.headers['Cache-Control'])
+            create_plan(1)
+            self.assertNotEqual(self.client.get(self.url).json()['version'], version)
+            self.assertIn('no-cache', self.client.get(self.url, {'v': version}).headers['Cache-Control'])
+
+    def test_per_process_versions_are_never_immutable(self):
+        version = self.client.get(self.url).json()['version']
+        self.assertIn('no-cache', self.client.get(self.url, {'v': version}).headers['Cache-Control'])
+
+
+def uploaded_image(name='photo.png', size=(800, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (180, 120, 60)).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class RenditionTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(
+            MEDIA_ROOT=media_root.name, IMAGE_RENDITION_WIDTHS=[320, 640, 1280], IMAGE_RENDITION_FORMATS=['webp'],
+            IMAGE_RENDITIONS_IN_BACKGROUND=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.plan = create_plan(0)
+
+    def upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = HousePlanImage.objects.create(house_plan=self.plan, image=uploaded_image(), order=5)
+            self.plan.primary_image = uploaded_image('primary.png', (200, 100))
+            self.plan.save()
+        return image
+
+    def test_upload_creates_renditions_and_srcset(self):
+        image = self.upload()
+        self.assertEqual(
+            list(image.renditions.values_list('format', 'width', 'height')),
+            [('webp', 320, 240), ('webp', 640, 480)],
+        )
+        # Narrower than every configured width: one rendition at the original size
+        self.assertEqual(list(self.plan.primary_renditions.values_list('width', flat=True)), [200])
+
+        listed = self.client.get(reverse('house_plans_list')).json()[0]
+        srcset = listed['images'][-1]['srcset']['webp'].split(', ')
+        self.assertEqual([candidate.split(' ')[1] for candidate in srcset], ['320w', '640w'])
+        self.assertTrue(srcset[0].startswith(settings.MEDIA_URL + 'renditions/photo'))
+        self.assertEqual(listed['images'][0]['srcset'], {})
+        self.assertIn('200w', listed['primary_srcset']['webp'])
+
+        detail = self.client.get(reverse('house_plan_detail', args=[self.plan.pk])).json()
+        self.assertEqual(detail['images'][-1]['srcset'], listed['images'][-1]['srcset'])
+        with self.settings(HOUSE_PLANS_FAST_SERIALIZATION=[]):
+            cache.clear()
+            self.assertEqual(self.client.get(reverse('house_plans_list')).json()[0], listed)
+
+    def test_clearing_the_primary_image_drops_its_renditions(self):
+        self.upload()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plan.primary_image = None
+            self.plan.save()
+        self.assertFalse(self.plan.primary_renditions.exists())
+        for fast_paths in (settings.HOUSE_PLANS_FAST_SERIALIZATION, []):
+            with self.settings(HOUSE_PLANS_FAST_SERIALIZATION=fast_paths):
+                cache.clear()
+                listed = self.client.get(reverse('house_plans_list')).json()[0]
+                detail = self.client.get(reverse('house_plan_detail', args=[self.plan.pk])).json()
+            self.assertEqual(listed['primary_srcset'], {})
+            self.assertEqual(detail['primary_srcset'], {})
+
+    def test_background_rendering_reads_the_stored_original(self):
+        with self.settings(IMAGE_RENDITIONS_IN_BACKGROUND=True), \
+                mock.patch('houseplans.uploads.submit', side_effect=lambda function: function()) as submit:
+            image = self.upload()
+        self.assertEqual(submit.call_count, 2)
+        self.assertEqual(list(image.renditions.values_list('width', flat=True)), [320, 640])
+
+    def test_backfill_command_regenerates_missing_and_stale(self):
+        image = self.upload()
+        rendition = image.renditions.first()
+        ImageRendition.objects.filter(house_plan_image=image).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            ImageRendition.objects.create(
+                house_plan_image=HousePlanImage.objects.first(), format='webp', width=1, height=1,
+                file=rendition.file.name, source_name='replaced.png',
+            )
+        # The fixture images have no files behind them and are skipped
+        call_command('generate_renditions', '--workers', '1', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(image.renditions.count(), 2)
+        self.assertFalse(ImageRendition.objects.filter(source_name='replaced.png').exists())
+        self.assertIn('srcset', self.client.get(reverse('house_plan_detail', args=[self.plan.pk])).json()['images'][-1])
+
+    def test_rendering_module_loads_without_django(self):
+        # What a spawned generate_renditions worker imports to unpickle its task
+        subprocess.run(
+            [sys.executable, '-c', "import sys, houseplans.rendering; assert 'django' not in sys.modules"],
+            cwd=settings.BASE_DIR, check=True,
+        )
+
+    def test_backfill_refreshes_plans_that_only_lose_stale_renditions(self):
+        other = create_plan(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            ImageRendition.objects.create(
+                house_plan_image=other.images.first(), format='webp', width=1, height=1,
+                file='renditions/replaced-1w.webp', source_name='replaced.png',
+            )
+            schedule_plan_refresh(other.pk)
+        url = reverse('house_plan_detail', args=[other.pk])
+        stale = self.client.get(url)
+        self.assertNotEqual(stale.json()['images'][0]['srcset'], {})
+        call_command('generate_renditions', '--workers', '1', stdout=StringIO(), stderr=StringIO())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=stale.headers['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['images'][0]['srcset'], {})
+
+    def test_deleting_an_image_removes_its_files(self):
+        image = self.upload()
+        storage = image.image.storage
+        names = list(image.renditions.values_list('file', flat=True))
+        self.assertTrue(all(storage.exists(name) for name in names))
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(any(storage.exists(name) for name in names))
+
+
+class ImageMetadataTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name, IMAGE_RENDITIONS_ON_UPLOAD=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.plan = create_plan(0)
+
+    def upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = HousePlanImage.objects.create(house_plan=self.plan, image=uploaded_image(), order=5)
+            self.plan.primary_image = uploaded_image('primary.png', (200, 100))
+            self.plan.save()
+        return image
+
+    def assert_metadata(self, image):
+        image.refresh_from_db()
+        self.plan.refresh_from_db()
+        self.assertEqual((image.width, image.height), (800, 600))
+        self.assertEqual(image.byte_size, image.image.size)
+        self.assertEqual(image.dominant_color, '#b4783c')
+        self.assertTrue(image.lqip.startswith('data:image/jpeg;base64,'))
+        self.assertEqual((self.plan.primary_image_width, self.plan.primary_image_height), (200, 100))
+        self.assertEqual(self.plan.primary_image_color, '#b4783c')
+
+    def test_upload_records_metadata(self):
+        image = self.upload()
+        self.assert_metadata(image)
+
+        listed = self.client.get(reverse('house_plans_list')).json()[0]
+        self.assertEqual(listed['images'][-1]['width'], 800)
+        self.assertEqual(listed['images'][-1]['lqip'], image.lqip)
+        self.assertIsNone(listed['images'][0]['width'])
+        self.assertEqual(listed['primary_image_size'], self.plan.primary_image.size)
+        with self.settings(HOUSE_PLANS_FAST_SERIALIZATION=[]):
+            cache.clear()
+            self.assertEqual(self.client.get(reverse('house_plans_list')).json()[0], listed)
+
+    def test_backfill_command_fills_missing_metadata(self):
+        image = self.upload()
+        HousePlanImage.objects.update(width=None, height=None, byte_size=None, dominant_color='', lqip='')
+        HousePlan.objects.update(primary_image_width=None)
+        url = reverse('house_plan_detail', args=[self.plan.pk])
+        etag = self.client.get(url).headers['ETag']
+        # The fixture images have no files behind them and are skipped
+        call_command('backfill_image_metadata', '--workers', '2', stdout=StringIO(), stderr=StringIO())
+        self.assert_metadata(image)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['images'][-1]['width'], 800)
+
+
+class MediaURLTests(TestCase):
+    def test_public_urls_match_the_storage(self):
+        names = ['house_plan_images/front.jpg', 'renditions/back elevation-640w.webp', 'house_plans/ä.png']
+        public = HousePlanImageStorage(bucket_name='plans', custom_domain='cdn.example.com', querystring_auth=False)
+        for storage in (public, FileSystemStorage(base_url='/media/')):
+            build = file_url_builder(storage)
+            self.assertEqual([build(name) for name in names], [storage.url(name) for name in names])
+        self.assertEqual(file_url_builder(public)(names[0]), 'https://cdn.example.com/media/house_plan_images/front.jpg')
+
+    def test_signed_urls_still_come_from_the_storage(self):
+        signed = HousePlanImageStorage(bucket_name='plans', custom_domain='cdn.example.com', querystring_auth=True)
+        self.assertEqual(file_url_builder(signed), signed.url)
+
+
+class MultipartUploadTests(TestCase):
+    def test_storage_uses_the_configured_multipart_transfers(self):
+        with self.settings(AWS_S3_MULTIPART_THRESHOLD=32 * 1024 * 1024, AWS_S3_MAX_CONCURRENCY=4):
+            config = HousePlanImageStorage().transfer_config
+        self.assertEqual(config.multipart_threshold, 32 * 1024 * 1024)
+        self.assertEqual(config.multipart_chunksize, settings.AWS_S3_MULTIPART_CHUNKSIZE)
+        self.assertEqual(config.max_request_concurrency, 4)
+        self.assertTrue(config.use_threads)
+
+
+class UploadQueueTests(CatalogTestCase):
+    """The media storage is a FileSystemStorage here, standing in for S3"""
+
+    def setUp(self):
+        super().setUp()
+        media_root, staging_root = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.addCleanup(staging_root.cleanup)
+        settings_override = self.settings(
+            MEDIA_ROOT=media_root.name, IMAGE_UPLOAD_QUEUE=True, IMAGE_UPLOAD_STAGING_ROOT=staging_root.name,
+            IMAGE_UPLOAD_RETRIES=2, IMAGE_UPLOAD_RETRY_DELAY=0,
+            IMAGE_RENDITION_WIDTHS=[320], IMAGE_RENDITION_FORMATS=['webp'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.plan = create_plan(0)
+
+    def stage(self):
+        # Collect the on_commit upload instead of running it in the thread pool
+        with self.captureOnCommitCallbacks() as callbacks:
+            image = HousePlanImage.objects.create(house_plan=self.plan, image=uploaded_image(), order=5)
+        self.assertEqual(len(callbacks), 2)  # the upload and the plan refresh
+        return image
+
+    def test_save_stages_upload_and_worker_stores_it(self):
+        image = self.stage()
+        image.refresh_from_db()
+        self.assertEqual(image.upload_status, 'uploading')
+        self.assertEqual(image.width, 800)
+        self.assertTrue(staging_storage().exists(image.image.name))
+        self.assertFalse(default_storage.exists(image.image.name))
+        self.assertFalse(image.renditions.exists())
+        # Nothing links to the upload until it is stored
+        self.assertEqual(len(self.client.get(reverse('house_plans_list')).json()[0]['images']), 2)
+        detail = self.client.get(reverse('house_plan_detail', args=[self.plan.pk])).json()
+        self.assertNotIn(image.pk, [listed['id'] for listed in detail['images']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(upload_staged(image))
+        image.refresh_from_db()
+        self.assertEqual(image.upload_status, 'stored')
+        self.assertTrue(default_storage.exists(image.image.name))
+        self.assertFalse(staging_storage().exists(image.image.name))
+        self.assertEqual(list(image.renditions.values_list('width', flat=True)), [320])
+        listed = self.client.get(reverse('house_plans_list')).json()[0]
+        self.assertIn('320w', listed['images'][-1]['srcset']['webp'])
+
+    def test_primary_image_is_hidden_while_uploading(self):
+        with self.captureOnCommitCallbacks():
+            self.plan.primary_image = uploaded_image('primary.png', (200, 100))
+            self.plan.save()
+        for endpoints in (settings.HOUSE_PLANS_FAST_SERIALIZATION, []):
+            with self.settings(HOUSE_PLANS_FAST_SERIALIZATION=endpoints):
+                cache.clear()
+                listed = self.client.get(reverse('house_plans_list')).json()[0]
+                self.assertIsNone(listed['primary_image'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upload_staged(HousePlan.objects.get(pk=self.plan.pk))
+        detail = self.client.get(reverse('house_plan_detail', args=[self.plan.pk])).json()
+        self.assertTrue(detail['primary_image'].startswith(settings.MEDIA_URL + 'house_plans/primary'))
+
+    def test_failed_upload_is_retried_then_left_for_the_command(self):
+        image = self.stage()
+        save = FileSystemStorage._save
+        attempts = []
+
+        def flaky_save(storage, name, content):
+            attempts.append(name)
+            if len(attempts) <= 4:
+                raise ConnectionError('connection reset')
+            return save(storage, name, content)
+
+        with mock.patch.object(FileSystemStorage, '_save', flaky_save), self.assertLogs('houseplans.uploads'):
+            self.assertFalse(upload_staged(image))
+            self.assertEqual(len(attempts), 3)
+            image.refresh_from_db()
+            self.assertEqual(image.upload_status, 'failed')
+
+            # One more failure, then the command's retry goes through
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('process_uploads', stdout=StringIO(), stderr=StringIO())
+        image.refresh_from_db()
+        self.assertEqual(image.upload_status, 'stored')
+        self.assertTrue(default_storage.exists(image.image.name))
+
+    def test_replaced_upload_discards_the_stale_copy(self):
+        image = self.stage()
+        staged = HousePlanImage.objects.get(pk=image.pk)
+        with self.settings(IMAGE_UPLOAD_QUEUE=False):
+            image.image = uploaded_image('replacement.png')
+            image.save()
+        self.assertFalse(upload_staged(staged))
+        image.refresh_from_db()
+        self.assertEqual(image.upload_status, 'stored')
+        self.assertEqual(sorted(default_storage.listdir('house_plan_images')[1]), ['replacement.png'])
+
+
+class ContentAddressedStorageTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = self.settings(IMAGE_RENDITIONS_ON_UPLOAD=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = ContentAddressedFileSystemStorage(location=media_root.name)
+        storage_patch = mock.patch.object(HousePlanImage._meta.get_field('image'), 'storage', self.storage)
+        storage_patch.start()
+        self.addCleanup(storage_patch.stop)
+        self.plan = create_plan(0)
+
+    def add_image(self, upload, plan=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return HousePlanImage.objects.create(house_plan=plan or self.plan, image=upload, order=5)
+
+    def test_identical_uploads_share_one_object(self):
+        first = self.add_image(uploaded_image('render.png'))
+        second = self.add_image(uploaded_image('render-copy.png'), create_plan(1))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^house_plan_images/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(StoredObject.objects.get().refcount, 2)
+        other = self.add_image(uploaded_image(size=(400, 300)))
+        self.assertNotEqual(other.image.name, first.image.name)
+        self.assertEqual(StoredObject.objects.count(), 2)
+
+    def test_object_is_deleted_with_its_last_reference(self):
+        first = self.add_image(uploaded_image())
+        second = self.add_image(uploaded_image(), create_plan(1))
+        name = first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(StoredObject.objects.get().refcount, 1)
+
+        # Replacing the last reference releases the old object
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = uploaded_image(size=(400, 300))
+            second.save()
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(list(StoredObject.objects.values_list('name', 'refcount')), [(second.image.name, 1)])
+
+
+    def test_failed_upload_leaves_no_reference(self):
+        with mock.patch.object(FileSystemStorage, '_save', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError), transaction.atomic():
+                self.add_image(uploaded_image())
+        self.assertFalse(StoredObject.objects.exists())
+        image = self.add_image(uploaded_image())
+        self.assertTrue(self.storage.exists(image.image.name))
+        self.assertEqual(StoredObject.objects.get().refcount, 1)
+
+
+class ImportSourceMixin:
+    def setUp(self):
+        super().setUp()
+        media_root, source = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.addCleanup(source.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name, IMAGE_RENDITIONS_ON_UPLOAD=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.source = source.name
+        self.plans = [create_plan(0), create_plan(1)]
+        for plan, names in zip(self.plans, [['b-side.png', 'a-front.png'], ['kitchen.png']]):
+            os.makedirs(os.path.join(self.source, str(plan.pk)))
+            for name in names:
+                with open(os.path.join(self.source, str(plan.pk), name), 'wb') as file:
+                    file.write(uploaded_image(name).read())
+
+    def run_import(self, *args, workers=2):
+        out = StringIO()
+        with TestCase.captureOnCommitCallbacks(execute=True):
+            call_command('import_plan_images', *args, '--workers', str(workers), stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+
+class ImportPlanImagesTests(ImportSourceMixin, CatalogTestCase):
+
+    def test_directory_import_appends_images_in_name_order(self):
+        output = self.run_import(self.source)
+        self.assertIn('Uploaded 3 images', output)
+        imported = self.plans[0].images.filter(order__gte=2)
+        self.assertEqual(
+            [(image.order, os.path.basename(image.image.name)) for image in imported],
+            [(2, 'a-front.png'), (3, 'b-side.png')],
+        )
+        self.assertTrue(all(default_storage.exists(image.image.name) for image in imported))
+        self.assertEqual(imported[0].width, 800)
+        # bulk_create skips the signals, so the import refreshes the catalog itself
+        detail = self.client.get(reverse('house_plan_detail', args=[self.plans[1].pk])).json()
+        self.assertEqual([image['order'] for image in detail['images']], [0, 1, 2])
+
+    def test_interrupted_import_resumes_without_uploading_again(self):
+        with mock.patch.object(ImportPlanImagesCommand, 'create_rows', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_import(self.source)
+        self.assertEqual(HousePlanImage.objects.count(), 4)
+
+        output = self.run_import(self.source)
+        self.assertIn('Uploaded 0 images', output)
+        self.assertIn('3 were uploaded by an earlier run', output)
+        self.assertEqual(HousePlanImage.objects.count(), 7)
+        self.assertEqual(len(default_storage.listdir('house_plan_images')[1]), 3)
+        # Nothing is added twice
+        self.run_import(self.source)
+        self.assertEqual(HousePlanImage.objects.count(), 7)
+
+    def test_renders_only_the_imported_images(self):
+        with self.settings(IMAGE_RENDITIONS_ON_UPLOAD=True), \
+                mock.patch('houseplans.management.commands.import_plan_images.call_command') as command:
+            self.run_import(self.source)
+        imported = HousePlanImage.objects.filter(order__gte=2).values_list('pk', flat=True)
+        self.assertEqual(command.call_args.args, ('generate_renditions',))
+        self.assertEqual(sorted(command.call_args.kwargs['images']), sorted(imported))
+
+    def test_manifest_import(self):
+        manifest = os.path.join(self.source, 'manifest.csv')
+        with open(manifest, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['plan', 'path', 'title', 'order'])
+            writer.writerow([self.plans[1].pk, f'{self.plans[0].pk}/a-front.png', 'Front', 10])
+        self.run_import(manifest)
+        image = self.plans[1].images.get(order=10)
+        self.assertEqual(image.title, 'Front')
+        self.assertEqual(image.dominant_color, '#b4783c')
+
+
+class ContentAddressedImportTests(ImportSourceMixin, TransactionTestCase):
+    def test_content_addressed_references_follow_the_rows(self):
+        # The upload threads write StoredObject rows, so this can't run inside a test transaction
+        storage = ContentAddressedFileSystemStorage(location=settings.MEDIA_ROOT)
+        with mock.patch.object(HousePlanImage._meta.get_field('image'), 'storage', storage):
+            with mock.patch.object(ImportPlanImagesCommand, 'create_rows', side_effect=KeyboardInterrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.run_import(self.source, workers=1)
+            # Stored, but nothing uses it yet
+            self.assertEqual(StoredObject.objects.get().refcount, 0)
+            self.run_import(self.source, workers=1)
+        # The three files have the same content, and a plan gets it only once
+        self.assertEqual(HousePlanImage.objects.count(), 6)
+        self.assertEqual(StoredObject.objects.get().refcount, 2)
@@ -0,0 +1,95 @@
+"""
+Computed floor and room totals stored on HousePlan.
+
+The commit hook in signals.py recomputes the plans whose floors or rooms
+changed; the reconcile_plan_totals command recomputes the whole catalog.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+
+from .models import HousePlan, Floor, Room
+
+TOTAL_FIELDS = ['total_floor_area', 'floor_count', 'room_count', 'room_type_counts']
+
+# Category -> words that put a room name in it, checked in this order
+ROOM_CATEGORIES = [
+    ('bedroom', ('bedroom', 'bed room')),
+    ('bathroom', ('bathroom', 'bath', 'en-suite', 'ensuite', 'shower', 'toilet', 'wc')),
+    ('kitchen', ('kitchen', 'scullery', 'pantry')),
+    ('living', ('lounge', 'living', 'family room', 'tv room', 'sitting')),
+    ('dining', ('dining',)),
+    ('study', ('study', 'office', 'library')),
+    ('garage', ('garage',)),
+    ('laundry', ('laundry', 'utility')),
+    ('outdoor', ('patio', 'balcony', 'deck', 'stoep', 'veranda', 'terrace')),
+]
+OTHER_ROOMS = 'other'
+
+
+def room_category(name):
+    name = name.lower()
+    for category, words in ROOM_CATEGORIES:
+        if any(word in name for word in words):
+            return category
+    return OTHER_ROOMS
+
+
+def compute_totals(plan_ids):
+    """Totals of the given plans from two grouped queries, keyed by plan id"""
+    totals = {
+        pk: {'total_floor_area': Decimal('0.00'), 'floor_count': 0, 'room_count': 0, 'room_type_counts': {}}
+        for pk in plan_ids
+    }
+    floors = (
+        Floor.objects.filter(house_plan__in=plan_ids)
+        .order_by()
+        .values('house_plan_id')
+        .annotate(area=Sum('floor_area'), count=Count('id'))
+    )
+    for row in floors:
+        plan_totals = totals[row['house_plan_id']]
+        plan_totals['total_floor_area'] = row['area'] or Decimal('0.00')
+        plan_totals['floor_count'] = row['count']
+
+    categories = defaultdict(lambda: defaultdict(int))
+    rooms = (
+        Room.objects.filter(floor__house_plan__in=plan_ids)
+        .order_by()
+        .values('floor__house_plan_id', 'name')
+        .annotate(quantity=Sum('quantity'))
+    )
+    for row in rooms:
+        plan_id = row['floor__house_plan_id']
+        totals[plan_id]['room_count'] += row['quantity'] or 0
+        categories[plan_id][room_category(row['name'])] += row['quantity'] or 0
+    for plan_id, counts in categories.items():
+        totals[plan_id]['room_type_counts'] = dict(sorted(counts.items()))
+    return totals
+
+
+def update_plan_totals(plan_ids=None, batch_size=500):
+    """
+    Recompute the totals of the given plans (or the whole catalog) and write
+    the ones that changed. Returns the ids of the changed plans.
+    """
+    plans = HousePlan.objects.order_by('pk')
+    if plan_ids is not None:
+        plans = plans.filter(pk__in=plan_ids)
+    ids = list(plans.values_list('pk', flat=True))
+
+    changed = []
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        totals = compute_totals(batch)
+        stale = []
+        for plan in HousePlan.objects.filter(pk__in=batch).only('id', *TOTAL_FIELDS):
+            current = {name: getattr(plan, name) for name in TOTAL_FIELDS}
+            if current != totals[plan.pk]:
+                for name, value in totals[plan.pk].items():
+                    setattr(plan, name, value)
+                stale.append(plan)
+        HousePlan.objects.bulk_update(stale, TOTAL_FIELDS)
+        changed.extend(plan.pk for plan in stale)
+    return changed
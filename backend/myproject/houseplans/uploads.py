@@ -0,0 +1,169 @@
+"""
+Background upload of plan images to their storage.
+
+With IMAGE_UPLOAD_QUEUE on, a new original is written to local staging
+storage during the admin save instead of being sent to S3, and its row is
+saved with the upload status 'uploading'. Once the transaction commits, a
+per-process thread pool copies the staged file to the field's storage with
+retries, renders the renditions from the local copy and marks the row
+'stored'. The process_uploads command picks up uploads whose retries ran
+out or whose process went away.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+
+from .models import HousePlan, HousePlanImage
+from .renditions import create_renditions, rendition_owner
+
+logger = logging.getLogger(__name__)
+
+# Model -> upload status field
+STATUS_FIELDS = {
+    HousePlanImage: 'upload_status',
+    HousePlan: 'primary_image_upload_status',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def staging_storage():
+    return FileSystemStorage(location=settings.IMAGE_UPLOAD_STAGING_ROOT)
+
+
+def stage(instance):
+    """
+    Write the new upload of a plan image or plan to staging storage and mark
+    it 'uploading'. Called from pre_save, so FileField.pre_save sees a
+    committed file and doesn't send it to remote storage itself.
+    """
+    _, source = rendition_owner(instance)
+    name = source.field.generate_filename(instance, source.name)
+    source.file.seek(0)
+    source.name = staging_storage().save(name, source.file)
+    source._committed = True
+    setattr(instance, STATUS_FIELDS[type(instance)], 'uploading')
+
+
+def pending_uploads(statuses=('failed',)):
+    """Plan images and plans whose original is still in staging storage"""
+    return [
+        instance
+        for model, status_field in STATUS_FIELDS.items()
+        for instance in model.objects.filter(**{f'{status_field}__in': statuses}).order_by('pk')
+    ]
+
+
+def push(instance):
+    """
+    Copy the staged original to the field's storage, retrying with
+    exponential backoff. Only touches storage, so it is safe to run in a
+    thread pool. Returns the name the storage saved it under.
+    """
+    _, source = rendition_owner(instance)
+    staging = staging_storage()
+    attempts = settings.IMAGE_UPLOAD_RETRIES + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            with staging.open(source.name, 'rb') as staged:
+                return source.storage.save(source.name, staged)
+        except FileNotFoundError:
+            raise
+        except Exception:
+            # boto3 raises its own exception types, not just OSError
+            if attempt == attempts:
+                raise
+            logger.warning('Uploading %s failed (attempt %d of %d)', source.name, attempt, attempts, exc_info=True)
+            time.sleep(settings.IMAGE_UPLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+
+
+def complete(instance, stored_name):
+    """Point the row at its stored original, render its renditions and remove the staged copy"""
+    model = type(instance)
+    _, source = rendition_owner(instance)
+    staged_name, field_name = source.name, source.field.name
+    staging = staging_storage()
+    # The row may have been deleted or given another file while its upload ran
+    still_staged = model.objects.filter(pk=instance.pk, **{field_name: staged_name})
+    if not still_staged.exists():
+        source.storage.delete(stored_name)
+        staging.delete(staged_name)
+        return False
+
+    source.name = stored_name
+    if settings.IMAGE_RENDITIONS_ON_UPLOAD:
+        try:
+            with staging.open(staged_name, 'rb') as staged:
+                create_renditions(instance, staged)
+        except OSError:
+            # generate_renditions retries these
+            logger.warning('Could not render %s', stored_name, exc_info=True)
+    with transaction.atomic():
+        if still_staged.select_for_update().exists():
+            setattr(instance, STATUS_FIELDS[model], 'stored')
+            # post_save refreshes the plan's snapshots and bumps the catalog version
+            instance.save(update_fields=[field_name, STATUS_FIELDS[model]])
+        else:
+            source.storage.delete(stored_name)
+    staging.delete(staged_name)
+    return True
+
+
+def mark_failed(instance):
+    _, source = rendition_owner(instance)
+    type(instance).objects.filter(pk=instance.pk, **{source.field.name: source.name}).update(
+        **{STATUS_FIELDS[type(instance)]: 'failed'}
+    )
+
+
+def upload_staged(instance):
+    """Upload one staged original; a failure leaves it for process_uploads"""
+    try:
+        stored_name = push(instance)
+    except Exception:
+        logger.exception('Giving up on uploading %s', rendition_owner(instance)[1].name)
+        mark_failed(instance)
+        return False
+    return complete(instance, stored_name)
+
+
+def upload_row(model, pk):
+    instance = model.objects.filter(pk=pk).first()
+    if instance is not None:
+        upload_staged(instance)
+
+
+def run_in_background(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Background task %s failed', function.__name__)
+    finally:
+        # Worker threads open their own connection
+        connection.close()
+
+
+def executor():
+    # Created on first use, so each forked server process gets its own threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_UPLOAD_WORKERS, thread_name_prefix='image-upload'
+            )
+    return _executor
+
+
+def submit(function, *args):
+    """Run `function` in the per-process worker threads"""
+    return executor().submit(run_in_background, function, *args)
+
+
+def enqueue(instance):
+    return submit(upload_row, type(instance), instance.pk)
@@ -4,8 +4,14 @@ from . import views
 urlpatterns = [
     # House Plans API
     path('api/house-plans/', views.house_plans_list, name='house_plans_list'),
+    path('api/house-plans/batch/', views.house_plans_batch, name='house_plans_batch'),
+    path('api/house-plans/compare/', views.compare_house_plans, name='compare_house_plans'),
+    path('api/house-plans/export/<str:export_format>/', views.export_house_plans, name='export_house_plans'),
+    path('api/house-plans/search/', views.search_house_plans, name='search_house_plans'),
     path('api/house-plans/<int:pk>/', views.house_plan_detail, name='house_plan_detail'),
+    path('api/house-plans/<int:pk>/similar/', views.similar_house_plans, name='similar_house_plans'),
     path('api/built-homes/', views.built_homes, name='built_homes'),
+    path('api/home/', views.home_sections, name='home_sections'),
     
     # Contact APIs
     path('api/quote-request/', views.create_quote_request, name='create_quote_request'),
@@ -18,4 +24,6 @@ urlpatterns = [
     
     # Site Settings API
     path('api/site-settings/', views.get_site_settings, name='get_site_settings'),
+    path('api/bootstrap/', views.bootstrap, name='bootstrap'),
+    path('api/cache-stats/', views.get_cache_stats, name='get_cache_stats'),
 ]
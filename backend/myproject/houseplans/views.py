@@ -1,11 +1,18 @@
 from django.shortcuts import render
+from django.db.models import Count, Max, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from django.conf import settings
+import hashlib
 import requests
 from datetime import datetime
-from .models import HousePlan, HousePlanImage, Floor, Room, Feature, Amenity, QuoteRequest, ContactMessage, Purchase, SiteSettings
+from .models import HousePlan, HousePlanQuerySet, HousePlanImage, Floor, Room, Feature, Amenity, QuoteRequest, ContactMessage, Purchase, SiteSettings, SimilarPlan
 from .serializers import (
     HousePlanDetailSerializer, 
     HousePlanListSerializer,
@@ -16,35 +23,283 @@ from .serializers import (
     AmenitySerializer,
     SiteSettingsSerializer
 )
+from .cache import CATALOG, SITE_SETTINGS, cache_response, cache_stats, get_version, versions_shared
+from .conditional import bootstrap_condition, bootstrap_version, catalog_condition, plan_condition, site_settings_condition
+from . import comparison, fastpath
+from .export import EXPORT_FORMATS
+from .filters import HousePlanFilter
+from .pagination import HousePlanCursorPagination
+from .search import search_plan_ids
+from .snapshots import get_snapshot, get_snapshots
 
+
+def requested_fields(request, serializer_class):
+    """Parse the ?fields= projection, returning None when the full shape is wanted"""
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = sorted(set(fields) - set(serializer_class.Meta.fields))
+    if unknown:
+        raise ValidationError({'fields': f"Unknown fields: {', '.join(unknown)}"})
+    return ['id'] + [name for name in fields if name != 'id']
+
+
+def list_serialization(endpoint, plans, fields, *extra):
+    """
+    Pick the serialization engine configured for a listing endpoint. Returns the
+    queryset to page through and a function turning a page of it into data.
+    """
+    if fastpath.is_enabled(endpoint):
+        row_serializer = fastpath.list_serializer(fields)
+        return row_serializer.rows(plans, *extra), row_serializer.serialize
+    # `extra` columns (the cursor keys) are loaded even when ?fields= leaves them out
+    plans = plans.for_list(None if fields is None else [*fields, *extra])
+    return plans, lambda page: HousePlanListSerializer(page, many=True, fields=fields).data
+
+
+def plan_listing_response(request, plans, endpoint):
+    """
+    Filter and serialize a house plan listing. Pagination and facet counts are
+    only added when the client asks for them with ?page_size=/?cursor= and ?facets=1.
+    """
+    fields = requested_fields(request, HousePlanListSerializer)
+    filterset = HousePlanFilter(request.query_params, queryset=plans)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    paginator = HousePlanCursorPagination()
+    plans = filterset.qs.order_by(*paginator.select_ordering(request))
+    plans, serialize = list_serialization(endpoint, plans, fields, *paginator.ordering_fields())
+    with_facets = request.query_params.get('facets', '').lower() in ('1', 'true')
+    facets = filterset.facet_counts() if with_facets else None
+
+    if paginator.is_requested(request):
+        page = paginator.paginate_queryset(plans, request)
+        response = paginator.get_paginated_response(serialize(page))
+        if facets is not None:
+            response.data['facets'] = facets
+        return response
+
+    data = serialize(plans)
+    if facets is not None:
+        return Response({'results': data, 'facets': facets})
+    return Response(data)
+
+@catalog_condition
+@cache_response(CATALOG)
 @api_view(['GET'])
 def house_plans_list(request):
-    """Get all house plans"""
-    display_location = request.query_params.get('display_on', None)
-    
-    plans = HousePlan.objects.all()
-    if display_location:
-        plans = plans.filter(display_location=display_location)
-    
-    serializer = HousePlanListSerializer(plans, many=True)
-    return Response(serializer.data)
+    """Get all house plans, optionally filtered by ?display_on= and the other HousePlanFilter parameters"""
+    return plan_listing_response(request, HousePlan.objects.all(), 'house_plans_list')
 
+@plan_condition
+@cache_response(CATALOG)
 @api_view(['GET'])
 def house_plan_detail(request, pk):
     """Get detailed information about a specific house plan"""
+    fields = requested_fields(request, HousePlanDetailSerializer)
+    if fields is None:
+        # Full detail documents are served pre-encoded from the snapshot table
+        payload, snapshot_key = get_snapshot(pk)
+        if payload is not None:
+            response = HttpResponse(payload, content_type='application/json')
+            response.compression_key = snapshot_key
+            return response
+    if fastpath.is_enabled('house_plan_detail'):
+        row_serializer = fastpath.detail_serializer(fields)
+        data = row_serializer.serialize(row_serializer.rows(HousePlan.objects.filter(pk=pk)))
+        if not data:
+            return Response({'error': 'House plan not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data[0])
     try:
-        plan = HousePlan.objects.get(pk=pk)
-        serializer = HousePlanDetailSerializer(plan)
+        plan = HousePlan.objects.for_detail(fields).get(pk=pk)
+        serializer = HousePlanDetailSerializer(plan, fields=fields)
         return Response(serializer.data)
     except HousePlan.DoesNotExist:
         return Response({'error': 'House plan not found'}, status=status.HTTP_404_NOT_FOUND)
 
+@catalog_condition
+@cache_response(CATALOG)
+@api_view(['GET'])
+def similar_house_plans(request, pk):
+    """Get the plans most like this one, closest first, from the precomputed SimilarPlan table"""
+    fields = requested_fields(request, HousePlanListSerializer)
+    similar_ids = list(SimilarPlan.objects.filter(house_plan=pk).values_list('similar_id', flat=True))
+    if not similar_ids and not HousePlan.objects.filter(pk=pk).exists():
+        return Response({'error': 'House plan not found'}, status=status.HTTP_404_NOT_FOUND)
+    plans, serialize = list_serialization('similar_house_plans', HousePlan.objects.filter(pk__in=similar_ids), fields)
+    # Rows on the fast path are dicts, model instances otherwise
+    rank = {plan_id: index for index, plan_id in enumerate(similar_ids)}
+    plans = sorted(plans, key=lambda plan: rank[plan['id'] if isinstance(plan, dict) else plan.pk])
+    return Response(serialize(plans))
+
+def detail_payloads(plan_ids):
+    """
+    Encoded detail documents of several plans keyed by id, from their snapshots
+    where available and one shared set of queries for the rest.
+    """
+    payloads = get_snapshots(plan_ids)
+    stale = [pk for pk in plan_ids if pk not in payloads]
+    if stale:
+        if fastpath.is_enabled('house_plan_detail'):
+            row_serializer = fastpath.detail_serializer()
+            data = row_serializer.serialize(row_serializer.rows(HousePlan.objects.filter(pk__in=stale)))
+        else:
+            data = HousePlanDetailSerializer(HousePlan.objects.for_detail().filter(pk__in=stale), many=True).data
+        renderer = JSONRenderer()
+        payloads.update((item['id'], renderer.render(item)) for item in data)
+    return payloads
+
+def requested_ids(request, minimum, maximum):
+    """Parse the ?ids= list, dropping duplicates but keeping the requested order"""
+    try:
+        plan_ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+    except ValueError:
+        raise ValidationError({'ids': 'A comma-separated list of integer ids is required.'})
+    plan_ids = list(dict.fromkeys(plan_ids))
+    if not minimum <= len(plan_ids) <= maximum:
+        raise ValidationError({'ids': f'Between {minimum} and {maximum} ids are required.'})
+    return plan_ids
+
+@catalog_condition
+@cache_response(CATALOG)
+@api_view(['GET'])
+def house_plans_batch(request):
+    """Get the detail documents of up to HOUSE_PLANS_BATCH_MAX_IDS plans, in the requested order"""
+    plan_ids = requested_ids(request, 1, settings.HOUSE_PLANS_BATCH_MAX_IDS)
+
+    payloads = detail_payloads(plan_ids)
+    missing = [pk for pk in plan_ids if pk not in payloads]
+    # Splice the pre-encoded documents into the response instead of decoding them again
+    body = b''.join([
+        b'{"results":[',
+        b','.join(payloads[pk] for pk in plan_ids if pk in payloads),
+        b'],"missing":',
+        JSONRenderer().render(missing),
+        b'}',
+    ])
+    return HttpResponse(body, content_type='application/json')
+
+@catalog_condition
+@cache_response(CATALOG)
+@api_view(['GET'])
+def compare_house_plans(request):
+    """Side-by-side specs, floor totals and room-type counts of 2 to 6 plans"""
+    plan_ids = requested_ids(request, comparison.MIN_PLANS, comparison.MAX_PLANS)
+    data = comparison.compare_plans(plan_ids)
+    if data is None:
+        return Response({'error': 'House plan not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(data)
+
+@catalog_condition
+@api_view(['GET'])
+def export_house_plans(request, export_format):
+    """Stream the whole catalog as JSON Lines or CSV; ?nested=1 adds floors, rooms, features and amenities"""
+    # The URL kwarg isn't called `format`, DRF reserves that for content negotiation
+    if export_format not in EXPORT_FORMATS:
+        return Response({'error': f"Unknown export format, choose one of: {', '.join(EXPORT_FORMATS)}"},
+                        status=status.HTTP_404_NOT_FOUND)
+    content_type, lines = EXPORT_FORMATS[export_format]
+    nested = request.query_params.get('nested', '').lower() in ('1', 'true')
+    response = StreamingHttpResponse(lines(nested), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="house-plans.{export_format}"'
+    return response
+
+@catalog_condition
+@api_view(['GET'])
+def search_house_plans(request):
+    """Full-text search across plan titles, descriptions, features, amenities and rooms"""
+    query = request.query_params.get('q', '').strip()
+    fields = requested_fields(request, HousePlanListSerializer)
+    try:
+        limit = int(request.query_params.get('limit', settings.HOUSE_PLANS_SEARCH_LIMIT))
+    except ValueError:
+        raise ValidationError({'limit': 'A valid integer is required.'})
+    limit = max(1, min(limit, settings.HOUSE_PLANS_SEARCH_LIMIT))
+
+    display_location = request.query_params.get('display_on', None)
+    plan_ids = search_plan_ids(query, limit=limit, display_location=display_location) if query else []
+    plans = HousePlan.objects.filter(pk__in=plan_ids)
+    plans, serialize = list_serialization('search_house_plans', plans, fields)
+
+    # Keep the ranking order of the search index
+    data = {item['id']: item for item in serialize(plans)}
+    return Response([data[pk] for pk in plan_ids if pk in data])
+
+@catalog_condition
+@cache_response(CATALOG)
 @api_view(['GET'])
 def built_homes(request):
     """Get all built homes (house plans with display_location='built_plans_page')"""
-    plans = HousePlan.objects.filter(display_location='built_plans_page')
-    serializer = HousePlanListSerializer(plans, many=True)
-    return Response(serializer.data)
+    return plan_listing_response(request, HousePlan.objects.built_homes(), 'built_homes')
+
+@catalog_condition
+@cache_response(CATALOG)
+@api_view(['GET'])
+def home_sections(request):
+    """
+    Get the popular, best-selling, new and featured plans for the homepage.
+    Sections list plan ids; each plan is serialized once under `plans` even
+    when it appears in several sections.
+    """
+    # requested_fields always includes the id the plans are keyed by
+    fields = requested_fields(request, HousePlanListSerializer)
+    try:
+        limit = int(request.query_params.get('limit', settings.HOUSE_PLANS_HOME_SECTION_SIZE))
+    except ValueError:
+        raise ValidationError({'limit': 'A valid integer is required.'})
+    limit = max(1, min(limit, settings.HOUSE_PLANS_HOME_SECTION_SIZE))
+
+    sections = {
+        name: list(HousePlan.objects.home_section(name).values_list('id', flat=True)[:limit])
+        for name in HousePlanQuerySet.HOME_SECTIONS
+    }
+    plan_ids = {pk for ids in sections.values() for pk in ids}
+    plans, serialize = list_serialization('home_sections', HousePlan.objects.filter(pk__in=plan_ids), fields)
+    plans = serialize(plans.order_by('-created_at', '-id'))
+    return Response({
+        'sections': sections,
+        'plans': {str(plan['id']): plan for plan in plans},
+    })
+
+@bootstrap_condition
+@api_view(['GET'])
+def bootstrap(request):
+    """
+    Everything the frontend needs on first paint in one response: site settings,
+    the Yoco public key, the catalog version and the homepage section counts.
+    Requested as ?v=<version> it is cacheable for a year, since any change gives
+    a new version; without it clients revalidate with the ETag. A per-process
+    cache has per-process versions, so there it is always revalidated.
+    """
+    version = bootstrap_version()
+    counts = HousePlan.objects.order_by().aggregate(
+        count=Count('id'),
+        last_modified=Max('updated_at'),
+        built_homes=Count('id', filter=Q(display_location='built_plans_page')),
+        **{name: Count('id', filter=condition) for name, condition in HousePlanQuerySet.HOME_SECTIONS.items()},
+    )
+    count, last_modified = counts.pop('count'), counts.pop('last_modified')
+    response = Response({
+        'version': version,
+        'site_settings': SiteSettingsSerializer(SiteSettings.get_cached()).data,
+        'yoco_public_key': settings.YOCO_PUBLIC_KEY,
+        'catalog': {
+            'version': get_version(CATALOG),
+            # Changes whenever any catalog listing's ETag does
+            'etag': hashlib.md5(f'{count}:{last_modified}'.encode()).hexdigest(),
+            'last_modified': last_modified,
+            'count': count,
+        },
+        'sections': counts,
+    })
+    if request.query_params.get('v') == version and versions_shared():
+        patch_cache_control(response, public=True, max_age=settings.BOOTSTRAP_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    # The body only changes with the version, so its compressed variants can be reused
+    response.compression_key = f'houseplans:bootstrap:{version}'
+    return response
 
 @api_view(['POST'])
 def create_quote_request(request):
@@ -135,11 +390,13 @@ def create_purchase(request):
             'error': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
 
+@site_settings_condition
+@cache_response(SITE_SETTINGS)
 @api_view(['GET'])
 def get_site_settings(request):
     """Get site settings"""
     try:
-        site_settings = SiteSettings.get_settings()
+        site_settings = SiteSettings.get_cached()
         serializer = SiteSettingsSerializer(site_settings)
         return Response(serializer.data)
     except Exception as e:
@@ -148,6 +405,13 @@ def get_site_settings(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_cache_stats(request):
+    """Get response cache hit/miss counters (staff only)"""
+    return Response(cache_stats())
+
+
 @api_view(['GET'])
 def get_yoco_public_key(request):
     """Get Yoco public key for frontend"""
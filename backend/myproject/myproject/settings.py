@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_filters',
     'corsheaders',
     'storages',
     'houseplans',
@@ -49,6 +51,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'houseplans.middleware.APICompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,6 +73,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'houseplans.context_processors.site_settings',
             ],
         },
     },
@@ -100,6 +104,56 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# The API cache versions live in the cache, so every gunicorn worker has to see
+# the same one. The local-memory cache is per process and only the development
+# default; production defaults to the file cache, shared by the workers of an
+# instance. Use CACHE_BACKEND=db to share it between instances as well (needs
+# `manage.py createcachetable`).
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem' if DEBUG else 'file')
+
+if CACHE_BACKEND == 'locmem' and config('WEB_CONCURRENCY', default=1, cast=int) > 1:
+    raise ImproperlyConfigured(
+        'CACHE_BACKEND=locmem is per process, so with WEB_CONCURRENCY > 1 workers would serve stale '
+        'API responses. Use CACHE_BACKEND=file or db.'
+    )
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': config('CACHE_LOCATION', default='houseplans_cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cached GET responses of the read API, invalidated by catalog signals
+API_CACHE_ALIAS = config('API_CACHE_ALIAS', default='default')
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+# Seconds between writes of each process's cache and compression statistics to the cache
+API_CACHE_STATS_FLUSH_INTERVAL = config('API_CACHE_STATS_FLUSH_INTERVAL', default=30, cast=int)
+
+# Brotli/gzip compression of JSON API responses (brotli is used when installed)
+API_COMPRESSION_PATH_PREFIX = '/api/'
+API_COMPRESSION_MIN_SIZE = config('API_COMPRESSION_MIN_SIZE', default=1024, cast=int)
+API_COMPRESSION_GZIP_LEVEL = config('API_COMPRESSION_GZIP_LEVEL', default=6, cast=int)
+API_COMPRESSION_BROTLI_QUALITY = config('API_COMPRESSION_BROTLI_QUALITY', default=5, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -162,7 +216,8 @@ if USE_S3:
     
     # S3 additional settings for optimization
     AWS_S3_SIGNATURE_VERSION = 's3v4'
-    AWS_S3_MAX_MEMORY_SIZE = 52428800  # 50MB
+    # Files written through storage.open() spill from memory to a temp file above this size
+    AWS_S3_MAX_MEMORY_SIZE = config('AWS_S3_MAX_MEMORY_SIZE', default=5242880, cast=int)  # 5MB
     AWS_QUERYSTRING_AUTH = False  # Allow public access to media files
     # NOTE: AWS_DEFAULT_ACL removed - bucket has block public ACL enabled
     
@@ -174,6 +229,48 @@ if USE_S3:
     # URL for accessing media files from S3
     MEDIA_URL = f'{AWS_S3_URL_PROTOCOL}//{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/'
 
+# House plan catalog API
+# Cursor pagination is opt-in: clients send ?page_size= or ?cursor= to enable it
+HOUSE_PLANS_PAGE_SIZE = config('HOUSE_PLANS_PAGE_SIZE', default=24, cast=int)
+HOUSE_PLANS_MAX_PAGE_SIZE = config('HOUSE_PLANS_MAX_PAGE_SIZE', default=100, cast=int)
+HOUSE_PLANS_SEARCH_LIMIT = config('HOUSE_PLANS_SEARCH_LIMIT', default=50, cast=int)
+HOUSE_PLANS_BATCH_MAX_IDS = config('HOUSE_PLANS_BATCH_MAX_IDS', default=50, cast=int)
+# Neighbours precomputed per plan for /api/house-plans/<pk>/similar/
+HOUSE_PLANS_SIMILAR_COUNT = config('HOUSE_PLANS_SIMILAR_COUNT', default=6, cast=int)
+# Plans per section of /api/home/
+HOUSE_PLANS_HOME_SECTION_SIZE = config('HOUSE_PLANS_HOME_SECTION_SIZE', default=8, cast=int)
+# Responsive renditions of uploaded plan images (formats this Pillow build can't encode are skipped)
+IMAGE_RENDITIONS_ON_UPLOAD = config('IMAGE_RENDITIONS_ON_UPLOAD', default=True, cast=bool)
+IMAGE_RENDITION_WIDTHS = config('IMAGE_RENDITION_WIDTHS', default='320,640,1280', cast=lambda v: [int(w) for w in v.split(',') if w.strip()])
+IMAGE_RENDITION_FORMATS = config('IMAGE_RENDITION_FORMATS', default='webp,avif', cast=lambda v: [f.strip() for f in v.split(',') if f.strip()])
+IMAGE_RENDITION_QUALITY = {'webp': 80, 'avif': 60}
+# Render the renditions of an upload in the worker threads of houseplans.uploads instead of the request
+IMAGE_RENDITIONS_IN_BACKGROUND = config('IMAGE_RENDITIONS_IN_BACKGROUND', default=True, cast=bool)
+# Multipart transfers of HousePlanImageStorage: files above the threshold are sent in parts, several at once
+AWS_S3_MULTIPART_THRESHOLD = config('AWS_S3_MULTIPART_THRESHOLD', default=16777216, cast=int)  # 16MB
+AWS_S3_MULTIPART_CHUNKSIZE = config('AWS_S3_MULTIPART_CHUNKSIZE', default=8388608, cast=int)  # 8MB
+AWS_S3_MAX_CONCURRENCY = config('AWS_S3_MAX_CONCURRENCY', default=8, cast=int)
+# Name plan images by the SHA-256 of their content, so identical uploads are stored once
+IMAGE_STORAGE_CONTENT_ADDRESSED = config('IMAGE_STORAGE_CONTENT_ADDRESSED', default=False, cast=bool)
+# Admin uploads are staged on disk and copied to storage by background threads (see houseplans.uploads).
+# Off by default: IMAGE_UPLOAD_STAGING_ROOT must be a persistent disk that survives deploys and restarts
+IMAGE_UPLOAD_QUEUE = config('IMAGE_UPLOAD_QUEUE', default=False, cast=bool)
+IMAGE_UPLOAD_STAGING_ROOT = config('IMAGE_UPLOAD_STAGING_ROOT', default=os.path.join(BASE_DIR, 'upload_staging'))
+IMAGE_UPLOAD_WORKERS = config('IMAGE_UPLOAD_WORKERS', default=4, cast=int)
+IMAGE_UPLOAD_RETRIES = config('IMAGE_UPLOAD_RETRIES', default=3, cast=int)
+# Seconds before the first retry, doubled after each further failure
+IMAGE_UPLOAD_RETRY_DELAY = config('IMAGE_UPLOAD_RETRY_DELAY', default=2.0, cast=float)
+# Cache lifetime of /api/bootstrap/?v=<version>; a new version is a new URL
+BOOTSTRAP_MAX_AGE = config('BOOTSTRAP_MAX_AGE', default=31536000, cast=int)
+# Plans read per database round trip by the streaming catalog export
+HOUSE_PLANS_EXPORT_CHUNK_SIZE = config('HOUSE_PLANS_EXPORT_CHUNK_SIZE', default=500, cast=int)
+# Endpoints serialized from values() rows instead of DRF model serializers (same JSON, less CPU)
+HOUSE_PLANS_FAST_SERIALIZATION = config(
+    'HOUSE_PLANS_FAST_SERIALIZATION',
+    default='house_plans_list,built_homes,search_house_plans,similar_house_plans,home_sections,house_plan_detail,export_house_plans',
+    cast=lambda v: [s.strip() for s in v.split(',') if s.strip()],
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 